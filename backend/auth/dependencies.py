@@ -0,0 +1,39 @@
+# auth/dependencies.py
+import time
+from fastapi import HTTPException, Header
+from bson import ObjectId
+from bson.errors import InvalidId
+from auth.cache import token_cache, user_cache
+from auth.models import find_user_by_id
+from auth.utils import verify_token
+
+
+# ✅ Reusable dependency: the authenticated user for a Bearer access token.
+# Verified claims and user records are cached, so the common case costs
+# neither a JWT decode nor a database round trip.
+async def get_current_user(authorization: str = Header(None)) -> dict:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+
+    token = authorization.split(" ")[1]
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_token(token)
+        if not payload or payload.get("type") != "access":
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        # Never cache claims beyond the token's own expiry
+        token_cache.set(token, payload, ttl=payload["exp"] - time.time())
+
+    user_id = payload.get("sub")
+    user = user_cache.get(user_id)
+    if user is None:
+        try:
+            object_id = ObjectId(user_id)
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user = await find_user_by_id(object_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_cache.set(user_id, user)
+
+    return user
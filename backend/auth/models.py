@@ -1,6 +1,7 @@
 # auth/models.py
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import MONGO_URI, DB_NAME
+from auth.cache import invalidate_user
 
 # Initialize Mongo client
 client = AsyncIOMotorClient(MONGO_URI)
@@ -9,11 +10,30 @@ db = client[DB_NAME]
 # Access users collection
 users_collection = db["users"]
 
+# Synchronous handle on the same database for code running in worker threads
+# (job store, checkpoints): motor's client wraps a regular pymongo client
+def sync_database():
+    return client.delegate[DB_NAME]
+
+# Create indexes the lookups rely on (run once at startup)
+async def ensure_indexes():
+    await users_collection.create_index("email", unique=True)
+
 # Helper function to find user by email
 async def find_user_by_email(email: str):
     return await users_collection.find_one({"email": email})
 
+# Helper function to find user by id (without the password hash)
+async def find_user_by_id(user_id):
+    return await users_collection.find_one({"_id": user_id}, {"password": 0})
+
 # Helper function to create user
 async def create_user(user_data: dict):
     result = await users_collection.insert_one(user_data)
     return await users_collection.find_one({"_id": result.inserted_id})
+
+
+# Helper function to replace a user's password hash (e.g. bcrypt cost change)
+async def update_user_password(user_id, hashed_password: str):
+    await users_collection.update_one({"_id": user_id}, {"$set": {"password": hashed_password}})
+    invalidate_user(user_id)
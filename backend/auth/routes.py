@@ -1,10 +1,13 @@
 # auth/routes.py
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
-from bson import ObjectId
-from auth.models import users_collection, find_user_by_email, create_user
+from pymongo.errors import DuplicateKeyError
+from auth.models import find_user_by_email, create_user, update_user_password
+from auth.dependencies import get_current_user
 from auth.schemas import UserCreate, UserLogin, UserOut, TokenResponse, TokenRefresh
-from auth.utils import hash_password, verify_password, create_tokens, verify_token
+from auth.utils import (
+    hash_password_async, verify_password_async, create_tokens, verify_token, get_hash_pool_metrics,
+)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -15,9 +18,13 @@ async def register_user(user: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await hash_password_async(user.password)
     user_data = {"username": user.username, "email": user.email, "password": hashed_pw}
-    new_user = await create_user(user_data)
+    try:
+        new_user = await create_user(user_data)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration (unique email index)
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     return UserOut(id=str(new_user["_id"]), username=new_user["username"], email=new_user["email"])
 
@@ -26,8 +33,15 @@ async def register_user(user: UserCreate):
 @router.post("/login", response_model=TokenResponse)
 async def login_user(credentials: UserLogin):
     user = await find_user_by_email(credentials.email)
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    valid, new_hash = await verify_password_async(credentials.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored hash used an old bcrypt cost; upgrade it transparently
+        await update_user_password(user["_id"], new_hash)
 
     access_token, refresh_token = create_tokens(str(user["_id"]))
 
@@ -41,20 +55,7 @@ async def login_user(credentials: UserLogin):
 
 # ✅ Get current logged-in user
 @router.get("/me", response_model=UserOut)
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid token")
-
-    token = authorization.split(" ")[1]
-    payload = verify_token(token)
-    if not payload or payload.get("type") != "access":
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    user_id = payload.get("sub")
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+async def read_current_user(user: dict = Depends(get_current_user)):
     return UserOut(id=str(user["_id"]), username=user["username"], email=user["email"])
 
 
@@ -69,3 +70,9 @@ async def refresh_token(data: TokenRefresh):
     new_access_token, _ = create_tokens(user_id)
 
     return JSONResponse({"access_token": new_access_token})
+
+
+# ✅ Password hashing pool metrics (queue depth, wait/run time, rejections)
+@router.get("/hash-pool")
+async def hash_pool_metrics():
+    return get_hash_pool_metrics()
@@ -1,10 +1,41 @@
 # auth/utils.py
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from fastapi import HTTPException
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from config import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from config import (
+    JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS,
+    BCRYPT_ROUNDS, AUTH_HASH_WORKERS, AUTH_HASH_MAX_QUEUE,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes at any other cost are flagged by needs_update and rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt takes 100-300 ms of CPU; it runs here instead of on the event loop
+hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="auth-hash")
+hash_pool_lock = threading.Lock()
+hash_pool_metrics = {
+    "workers": AUTH_HASH_WORKERS,
+    "max_queue": AUTH_HASH_MAX_QUEUE,
+    "queued": 0,        # waiting for a worker
+    "running": 0,
+    "max_queued": 0,
+    "completed": 0,
+    "rejected": 0,
+    "wait_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+}
 
 # ✅ Hash password
 def hash_password(password: str) -> str:
@@ -14,6 +45,50 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# ✅ Run a hashing function on the bounded auth pool
+async def run_in_hash_pool(func, *args):
+    with hash_pool_lock:
+        if hash_pool_metrics["queued"] >= AUTH_HASH_MAX_QUEUE:
+            hash_pool_metrics["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        hash_pool_metrics["queued"] += 1
+        hash_pool_metrics["max_queued"] = max(hash_pool_metrics["max_queued"], hash_pool_metrics["queued"])
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        with hash_pool_lock:
+            hash_pool_metrics["queued"] -= 1
+            hash_pool_metrics["running"] += 1
+            hash_pool_metrics["wait_seconds_total"] += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with hash_pool_lock:
+                hash_pool_metrics["running"] -= 1
+                hash_pool_metrics["completed"] += 1
+                hash_pool_metrics["run_seconds_total"] += time.perf_counter() - started
+
+    return await asyncio.get_running_loop().run_in_executor(hash_executor, job)
+
+# ✅ Hash password off the event loop
+async def hash_password_async(password: str) -> str:
+    return await run_in_hash_pool(hash_password, password)
+
+# ✅ Verify password off the event loop; returns (valid, new_hash) where
+# new_hash is set when the stored hash uses an outdated bcrypt cost
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+# ✅ Snapshot of the auth pool metrics
+def get_hash_pool_metrics() -> dict:
+    with hash_pool_lock:
+        return dict(hash_pool_metrics)
+
 # ✅ Create JWT token
 def create_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
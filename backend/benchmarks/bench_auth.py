@@ -0,0 +1,163 @@
+# benchmarks/bench_auth.py
+"""
+Login-burst benchmark: does bcrypt stall the event loop?
+
+Starts the API with uvicorn in-process (users served from memory, no Mongo),
+keeps a session's progress changing and streams it from /progress/{id} while
+a burst of concurrent /auth/login calls is fired. Reports login latency and
+the largest gap between SSE events during the burst, for:
+    - offloaded: hashing on the bounded auth pool (current code)
+    - inline:    hashing on the event loop (previous behaviour)
+
+Run from the backend directory:
+    python -m benchmarks.bench_auth --logins 40
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import socket
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+
+EMAIL = "bench@example.com"
+PASSWORD = "correct horse battery staple"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def _drive(base_url: str, session_id: str, logins: int) -> dict:
+    arrivals = []
+    burst = {}
+
+    async def stream_progress(client):
+        async with client.stream("GET", f"{base_url}/progress/{session_id}") as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    arrivals.append(time.perf_counter())
+
+    async def login(client):
+        start = time.perf_counter()
+        response = await client.post(f"{base_url}/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        return response.status_code, time.perf_counter() - start
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        streamer = asyncio.create_task(stream_progress(client))
+        await asyncio.sleep(1.5)
+
+        burst["start"] = time.perf_counter()
+        outcomes = await asyncio.gather(*(login(client) for _ in range(logins)))
+        burst["end"] = time.perf_counter()
+
+        await asyncio.sleep(1.0)
+        streamer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await streamer
+        pool = (await client.get(f"{base_url}/auth/hash-pool")).json()
+
+    # SSE gaps overlapping the burst window
+    gaps = [
+        b - a for a, b in zip(arrivals, arrivals[1:])
+        if b >= burst["start"] and a <= burst["end"]
+    ]
+    latencies = [latency for status, latency in outcomes if status == 200]
+    return {
+        "ok": len(latencies),
+        "rejected": sum(1 for status, _ in outcomes if status == 503),
+        "burst_s": burst["end"] - burst["start"],
+        "login_p50": _percentile(latencies, 50),
+        "login_p95": _percentile(latencies, 95),
+        "sse_gap_max": max(gaps, default=0.0),
+        "sse_gap_p95": _percentile(gaps, 95),
+        "pool": pool,
+    }
+
+
+def run(mode: str, logins: int) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main
+        from auth import routes
+        from auth.utils import hash_password, pwd_context
+
+        user = {"_id": "bench-user", "username": "bench", "email": EMAIL, "password": hash_password(PASSWORD)}
+
+        async def find_user_by_email(email):
+            return user if email == EMAIL else None
+
+        async def update_user_password(user_id, hashed_password):
+            user["password"] = hashed_password
+
+        async def ensure_indexes():
+            pass
+
+        main.ensure_indexes = ensure_indexes
+        routes.find_user_by_email = find_user_by_email
+        routes.update_user_password = update_user_password
+        if mode == "inline":
+            async def verify_inline(plain_password, hashed_password):
+                return pwd_context.verify_and_update(plain_password, hashed_password)
+            routes.verify_password_async = verify_inline
+        else:
+            from auth import utils
+            routes.verify_password_async = utils.verify_password_async
+
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        # Keep the session's progress moving so every SSE poll has something to send
+        session_id = str(uuid.uuid4())
+        stop = threading.Event()
+
+        def feed_progress():
+            i = 0
+            while not stop.is_set():
+                main.update_progress(session_id, 1 + i % 98, "Benchmark tick")
+                i += 1
+                time.sleep(0.05)
+
+        feeder = threading.Thread(target=feed_progress, daemon=True)
+        feeder.start()
+        try:
+            result = asyncio.run(_drive(f"http://127.0.0.1:{port}", session_id, logins))
+        finally:
+            stop.set()
+            server.should_exit = True
+            server_thread.join(timeout=5)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login burst vs SSE progress benchmark")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--modes", default="offloaded,inline")
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'ok':>4} {'503':>4} {'burst s':>8} {'login p50':>9} {'login p95':>9} "
+          f"{'sse gap max':>11} {'sse gap p95':>11} {'max queued':>10}")
+    for mode in args.modes.split(","):
+        r = run(mode, args.logins)
+        max_queued = r["pool"]["max_queued"] if mode == "offloaded" else "-"
+        print(f"{mode:>10} {r['ok']:>4} {r['rejected']:>4} {r['burst_s']:>8.2f} {r['login_p50']:>9.3f} "
+              f"{r['login_p95']:>9.3f} {r['sse_gap_max']:>11.3f} {r['sse_gap_p95']:>11.3f} "
+              f"{max_queued:>10}")
+
+
+if __name__ == "__main__":
+    main()
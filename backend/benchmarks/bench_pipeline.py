@@ -0,0 +1,260 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of ``process_pdf_background`` against the local fakes.
+
+For every (pages, concurrency) scenario a fresh subprocess generates a
+synthetic guideline PDF, runs ``concurrency`` jobs side by side and reports:
+    - end-to-end throughput (pages/s) and concurrency scaling efficiency
+    - per-stage latency (OCR, chunking, generation, merge) from progress events
+    - peak RSS of the worker process
+    - calls / throttles / failures seen by the fake services
+    - generator calls skipped by chunk routing, and the number of output
+      entries (JSON leaves) so any recall loss from routing shows up
+
+Needs requirements-dev.txt and no network access: without the tiktoken BPE
+file (network, or a ``TIKTOKEN_CACHE_DIR`` holding it) chunking falls back to
+an approximate offline tokenizer, see benchmarks/fakes.py.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --pages 10,100,500,2000 --concurrency 1,4
+    python -m benchmarks.bench_pipeline --llm-throttle-rate 0.05 --json bench.json
+    python -m benchmarks.bench_pipeline --mode deferred
+    python -m benchmarks.bench_pipeline --layout guideline --no-routing
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Progress thresholds that mark the start/end of each pipeline stage
+STAGES = {
+    "ocr": (2, 25),
+    "chunking": (25, 30),
+    "generation": (30, 96),
+    "merge": (96, 100),
+}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _stage_latencies(events):
+    """Seconds spent in each stage, from one job's (time, progress) events."""
+    def first_at(threshold):
+        return next((t for t, p in events if p >= threshold), None)
+
+    latencies = {}
+    for stage, (start, end) in STAGES.items():
+        t_start, t_end = first_at(start), first_at(end)
+        latencies[stage] = t_end - t_start if t_start is not None and t_end is not None else None
+    return latencies
+
+
+def run_scenario(params: dict) -> dict:
+    """Run one scenario; meant to execute in a fresh subprocess."""
+    from benchmarks.fakes import LatencyModel, combined_snapshot, default_llm_config, default_ocr_config, install_fakes
+    from benchmarks.synthetic_pdf import build_guideline_pdf
+
+    ocr_config = default_ocr_config(
+        throttle_rate=params["ocr_throttle_rate"],
+        failure_rate=params["ocr_failure_rate"],
+        time_scale=params["time_scale"],
+        seed=params["seed"],
+    )
+    llm_config = default_llm_config(
+        latency=LatencyModel(base=1.5, per_unit=0.4, tail_rate=params["llm_tail_rate"], tail_factor=6.0),
+        throttle_rate=params["llm_throttle_rate"],
+        failure_rate=params["llm_failure_rate"],
+        time_scale=params["time_scale"],
+        seed=params["seed"],
+    )
+    # Keep the benchmark's documents out of the real rule search index
+    os.environ.setdefault("RULE_INDEX_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_index_"), "rule_index.db"))
+    # Every job is the same seeded PDF: checkpoints would serve all but the first from cache
+    os.environ["CHECKPOINT_STORE"] = "off"
+    if params["no_routing"]:
+        os.environ["CHUNK_ROUTING"] = "false"
+    # Timers in the pipeline run on the same compressed clock as the fakes
+    os.environ.setdefault("BATCH_POLL_INTERVAL_SECONDS", str(30 * params["time_scale"]))
+    os.environ.setdefault("LLM_HEDGE_MIN_DELAY_SECONDS", str(2.0 * params["time_scale"]))
+    ocr_service, llm_services = install_fakes(ocr_config, llm_config, llm_deployments=params["llm_deployments"])
+
+    sink = io.StringIO() if not params["verbose"] else None
+    with contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext():
+        import main
+        from utils import azure_openai
+        from utils.rule_index import flatten_component
+
+        events = {}
+        events_lock = threading.Lock()
+        original_update_progress = main.update_progress
+
+        def recording_update_progress(session_id, progress, message):
+            with events_lock:
+                events.setdefault(session_id, []).append((time.perf_counter(), progress))
+            original_update_progress(session_id, progress, message)
+
+        main.update_progress = recording_update_progress
+
+        pdf_bytes = build_guideline_pdf(
+            params["pages"], seed=params["seed"], scanned_ratio=params["scanned_ratio"], layout=params["layout"]
+        )
+        rss_before = _peak_rss_mb()
+
+        workdir = tempfile.mkdtemp(prefix="bench_")
+        jobs = []
+        for i in range(params["concurrency"]):
+            # process_pdf_background deletes its input, so every job gets a copy
+            path = os.path.join(workdir, f"guideline_{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(pdf_bytes)
+            session_id = str(uuid.uuid4())
+            jobs.append((session_id, threading.Thread(
+                target=main.process_pdf_background, args=(session_id, path, f"guideline_{i}.pdf", params["mode"])
+            )))
+
+        start = time.perf_counter()
+        for _, thread in jobs:
+            thread.start()
+        for _, thread in jobs:
+            thread.join()
+        wall = time.perf_counter() - start
+        os.rmdir(workdir)
+
+    stored = [main.job_store.get_result(sid) or {} for sid, _ in jobs]
+    statuses = [result.get("status") for result in stored]
+    output = stored[0].get("output_file") or {}
+    stats = stored[0].get("stats") or {}
+    per_job = [_stage_latencies(events.get(sid, [])) for sid, _ in jobs]
+    stage_means = {}
+    for stage in STAGES:
+        values = [job[stage] for job in per_job if job[stage] is not None]
+        stage_means[stage] = statistics.mean(values) if values else None
+
+    return {
+        "pages": params["pages"],
+        "concurrency": params["concurrency"],
+        "wall_s": wall,
+        "pages_per_s": params["pages"] * params["concurrency"] / wall,
+        "jobs_ok": statuses.count("success"),
+        "jobs_failed": len(statuses) - statuses.count("success"),
+        "stage_s": stage_means,
+        "rss_baseline_mb": rss_before,
+        "rss_peak_mb": _peak_rss_mb(),
+        "ocr": ocr_service.snapshot(),
+        "llm": combined_snapshot(llm_services),
+        "router": azure_openai.router.snapshot(),
+        "routing": {k: stats[k] for k in ("llm_calls", "llm_calls_skipped", "chunks_per_generator") if k in stats},
+        "output_leaves": {name: sum(1 for _ in flatten_component(items)) for name, items in output.items()},
+    }
+
+
+def _fmt(value, spec=".2f"):
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(results):
+    header = (
+        f"{'pages':>6} {'conc':>4} {'wall s':>8} {'pages/s':>8} {'scale':>6} "
+        f"{'ocr s':>7} {'chunk s':>7} {'gen s':>7} {'merge s':>7} {'rss MB':>7} "
+        f"{'ok/fail':>7} {'llm calls':>9} {'skipped':>7} {'hedges':>6} {'429s':>5} {'cached':>6} {'leaves':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    baseline = {}
+    for r in results:
+        if r["concurrency"] == 1:
+            baseline[r["pages"]] = r["pages_per_s"]
+        base = baseline.get(r["pages"])
+        scale = r["pages_per_s"] / (base * r["concurrency"]) if base else None
+        stages = r["stage_s"]
+        print(
+            f"{r['pages']:>6} {r['concurrency']:>4} {r['wall_s']:>8.2f} {r['pages_per_s']:>8.1f} "
+            f"{_fmt(scale):>6} {_fmt(stages['ocr']):>7} {_fmt(stages['chunking']):>7} "
+            f"{_fmt(stages['generation']):>7} {_fmt(stages['merge']):>7} {r['rss_peak_mb']:>7.0f} "
+            f"{r['jobs_ok']:>3}/{r['jobs_failed']:<3} {r['llm']['calls']:>9} "
+            f"{r['routing'].get('llm_calls_skipped', 0):>7} {r['router']['hedges']:>6} "
+            f"{r['ocr']['throttled'] + r['llm']['throttled']:>5} {r['router']['cached_ratio']:>6.0%} "
+            f"{sum(r['output_leaves'].values()):>6}"
+        )
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the guideline ingestion pipeline")
+    parser.add_argument("--pages", type=_int_list, default=[10, 100, 500, 2000])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4])
+    parser.add_argument("--time-scale", type=float, default=0.05,
+                        help="Multiplier on simulated Azure latency (1.0 = realistic)")
+    parser.add_argument("--scanned-ratio", type=float, default=0.0,
+                        help="Fraction of synthetic pages without a text layer")
+    parser.add_argument("--ocr-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-tail-rate", type=float, default=0.03,
+                        help="Fraction of LLM calls that are 6x-slower stragglers")
+    parser.add_argument("--llm-deployments", type=int, default=1,
+                        help="Number of fake deployments behind the LLM router")
+    parser.add_argument("--mode", choices=["interactive", "deferred"], default="interactive",
+                        help="Generation mode passed to process_pdf_background")
+    parser.add_argument("--layout", choices=["uniform", "guideline"], default="uniform",
+                        help="Synthetic document layout (see benchmarks/synthetic_pdf.py)")
+    parser.add_argument("--no-routing", action="store_true",
+                        help="Send every chunk to every generator (CHUNK_ROUTING=false)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write raw results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline logs")
+    args = parser.parse_args()
+
+    results = []
+    for pages in args.pages:
+        for concurrency in args.concurrency:
+            params = {
+                "pages": pages,
+                "concurrency": concurrency,
+                "time_scale": args.time_scale,
+                "scanned_ratio": args.scanned_ratio,
+                "ocr_throttle_rate": args.ocr_throttle_rate,
+                "ocr_failure_rate": args.ocr_failure_rate,
+                "llm_throttle_rate": args.llm_throttle_rate,
+                "llm_failure_rate": args.llm_failure_rate,
+                "llm_tail_rate": args.llm_tail_rate,
+                "llm_deployments": args.llm_deployments,
+                "mode": args.mode,
+                "layout": args.layout,
+                "no_routing": args.no_routing,
+                "seed": args.seed,
+                "verbose": args.verbose,
+            }
+            print(f"⏱️  Running {pages} pages x {concurrency} concurrent job(s)...")
+            # Fresh interpreter per scenario so peak RSS and module state are isolated
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results.append(pool.submit(run_scenario, params).result())
+
+    print()
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
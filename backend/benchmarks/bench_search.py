@@ -0,0 +1,92 @@
+# benchmarks/bench_search.py
+"""
+Rule search benchmark: index build rate and /search query latency.
+
+Builds a throwaway index of synthetic processed guidelines (rules and
+semantics shaped like the generators' output, spread over a set of lenders)
+and times RuleIndex.search for:
+    - rare:    a selective term ("ITIN")
+    - term:    a few stemmed terms ("citizen eligibility")
+    - phrase:  an exact phrase ("valid EAD or visa")
+    - lender:  terms restricted to a handful of lenders
+    - broad:   a term that matches a third of all entries
+
+The synthetic corpus is far more repetitive than real guidelines, so term,
+phrase and broad queries match tens of thousands of entries; their latency is
+dominated by BM25-scoring every match.
+
+Run from the backend directory:
+    python -m benchmarks.bench_search --documents 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic_pdf import SECTION_TITLES, TERMS, _rule
+from utils.rule_index import RuleIndex
+
+QUERIES = {
+    "rare": {"terms": "ITIN"},
+    "term": {"terms": "citizen eligibility"},
+    "phrase": {"phrase": "valid EAD or visa"},
+    "lender": {"terms": "reserves months", "lenders": ["Lender 1", "Lender 7", "Lender 23"]},
+    "broad": {"terms": "borrower"},
+}
+
+
+def synthetic_result(rng: random.Random) -> dict:
+    """A final result with the rules/semantics structure produced by the merge step"""
+    rules, semantics = [], []
+    for n, title in enumerate(rng.sample(SECTION_TITLES, 8)):
+        heading = f"{300 + n}. {title}"
+        section = {"summary": f"Requirements for {title.lower()}."}
+        for k in range(rng.randint(2, 5)):
+            section[f"{300 + n}.{k + 1} {rng.choice(SECTION_TITLES)}"] = " ".join(_rule(rng) for _ in range(2))
+        rules.append({heading: section})
+        term, definition = rng.choice(TERMS)
+        semantics.append({heading: {term: definition, "conditions": [_rule(rng), _rule(rng)]}})
+    return {"taxonomy": [], "ontology": [], "semantics": semantics, "rules": rules}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule search benchmark")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--lenders", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200, help="Repetitions per query kind")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = RuleIndex(os.path.join(tmp, "rule_index.db"))
+
+        start = time.perf_counter()
+        entries = 0
+        for n in range(args.documents):
+            entries += index.add_document(
+                f"doc-{n:06d}", f"Lender {n % args.lenders + 1}", f"guideline_{n}.pdf", synthetic_result(rng)
+            )
+        build_s = time.perf_counter() - start
+        print(f"Indexed {args.documents} documents ({entries:,} entries) in {build_s:.2f}s "
+              f"- {args.documents / build_s:,.0f} docs/s")
+
+        print(f"\n{'query':>8} {'hits':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for name, query in QUERIES.items():
+            latencies, total = [], 0
+            for _ in range(args.queries):
+                t0 = time.perf_counter()
+                total = index.search(**query)["total"]
+                latencies.append((time.perf_counter() - t0) * 1000)
+            print(f"{name:>8} {total:>8,} {statistics.median(latencies):>8.2f} "
+                  f"{_percentile(latencies, 95):>8.2f} {max(latencies):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
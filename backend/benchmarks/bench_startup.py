@@ -0,0 +1,96 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start benchmark for the API process.
+
+Each run uses a fresh interpreter and measures:
+    - import:  time to ``import main``
+    - serve:   time from launching uvicorn until ``GET /`` answers
+and lists the heavy modules that ``import main`` pulled in (the Azure SDKs,
+PyPDF2, openai and tiktoken should only load on first use or in the
+background warm-up).
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+HEAVY_MODULES = ("azure.ai.formrecognizer", "PyPDF2", "openai", "tiktoken")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_s": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_serve(env: dict, timeout: float = 30.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError(f"Server did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--no-serve", action="store_true", help="Only measure 'import main'")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [env.get("PYTHONPATH"), os.getcwd()]))
+
+    imports, serves, loaded = [], [], set()
+    for _ in range(args.runs):
+        probe = measure_import(env)
+        imports.append(probe["import_s"])
+        loaded.update(probe["loaded"])
+        if not args.no_serve:
+            serves.append(measure_serve(env))
+
+    print(f"{'metric':>10} {'min s':>7} {'median s':>8} {'max s':>7}")
+    for name, values in (("import", imports), ("serve /", serves)):
+        if values:
+            print(f"{name:>10} {min(values):>7.3f} {statistics.median(values):>8.3f} {max(values):>7.3f}")
+    print(f"\nHeavy modules loaded by 'import main': {', '.join(sorted(loaded)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,526 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for Azure Document Intelligence and Azure OpenAI.
+
+Both fakes expose just the client surface the pipeline uses
+(``begin_analyze_document(...).result()``, ``chat.completions.create(...)``
+and the Batch API's ``files`` / ``batches``) and simulate:
+    - latency (base + per-unit cost + jitter, scaled by ``time_scale``)
+    - throttling (429s, randomly and when in-flight calls exceed a quota)
+    - random server failures
+    - automatic prompt caching (LLM only): a prompt prefix of >= 1024 tokens seen
+      in an earlier, finished call is reported as ``cached_tokens`` and is cheaper
+
+Use ``install_fakes()`` to swap them into the pipeline modules.
+
+Chunking needs the gpt-4o tokenizer, whose BPE file tiktoken downloads on
+first use. To run fully offline (e.g. in CI), put the file in a directory
+named by ``TIKTOKEN_CACHE_DIR`` (tiktoken's own cache, filled by any run with
+network access). If it cannot be loaded, ``install_fakes()`` falls back to
+``OfflineEncoding``, which approximates token counts at ~4 characters/token.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import httpx
+import openai
+from azure.core.exceptions import HttpResponseError
+from PyPDF2 import PdfReader
+
+from benchmarks.synthetic_pdf import guideline_page_lines
+
+# -----------------------
+# Configuration
+# -----------------------
+@dataclass
+class LatencyModel:
+    """
+    Latency in seconds: ``base + per_unit * units``, +/- ``jitter`` fraction;
+    a ``tail_rate`` fraction of calls are stragglers, ``tail_factor`` x slower.
+    """
+    base: float = 0.0
+    per_unit: float = 0.0
+    jitter: float = 0.1
+    tail_rate: float = 0.0
+    tail_factor: float = 5.0
+
+    def sample(self, rng: random.Random, units: float = 1.0) -> float:
+        latency = self.base + self.per_unit * units
+        if rng.random() < self.tail_rate:
+            latency *= self.tail_factor
+        return max(0.0, latency * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+
+@dataclass
+class FakeServiceConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    throttle_rate: float = 0.0      # probability a call gets a 429
+    failure_rate: float = 0.0       # probability a call gets a 5xx
+    max_concurrency: int = 0        # in-flight calls above this get a 429 (0 = unlimited)
+    batch_turnaround: float = 0.0   # seconds for a Batch API job to complete (LLM only)
+    time_scale: float = 1.0         # multiplies every simulated delay
+    seed: int = 0
+
+
+def default_ocr_config(**overrides) -> FakeServiceConfig:
+    # prebuilt-layout: ~2s to accept + ~0.15s per page
+    config = FakeServiceConfig(latency=LatencyModel(base=2.0, per_unit=0.15), max_concurrency=15)
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+def default_llm_config(**overrides) -> FakeServiceConfig:
+    # chat completion: ~1.5s time-to-first-token + ~0.4s per 1k prompt tokens, 3% stragglers
+    config = FakeServiceConfig(
+        latency=LatencyModel(base=1.5, per_unit=0.4, tail_rate=0.03, tail_factor=6.0),
+        max_concurrency=30,
+        batch_turnaround=120.0,
+    )
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+# -----------------------
+# Shared fake service behaviour
+# -----------------------
+class _FakeService:
+    def __init__(self, config: Optional[FakeServiceConfig] = None):
+        self.config = config or FakeServiceConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {
+            "calls": 0,
+            "throttled": 0,
+            "failed": 0,
+            "peak_in_flight": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def _admit(self) -> Optional[str]:
+        """Register a call; return "throttled"/"failed" if it must be rejected."""
+        with self._lock:
+            self.stats["calls"] += 1
+            over_quota = self.config.max_concurrency and self._in_flight >= self.config.max_concurrency
+            if over_quota or self._rng.random() < self.config.throttle_rate:
+                self.stats["throttled"] += 1
+                return "throttled"
+            if self._rng.random() < self.config.failure_rate:
+                self.stats["failed"] += 1
+                return "failed"
+            self._in_flight += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+            return None
+
+    def _work(self, units: float):
+        with self._lock:
+            delay = self.config.latency.sample(self._rng, units) * self.config.time_scale
+        time.sleep(delay)
+        with self._lock:
+            self._in_flight -= 1
+            self.stats["busy_seconds"] += delay
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.stats)
+
+
+# -----------------------
+# Fake Document Intelligence
+# -----------------------
+_TJ_RE = re.compile(rb"\(((?:\\.|[^\\)])*)\) Tj")
+
+
+def _page_lines(page, page_number: int) -> List[str]:
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    lines = [
+        re.sub(rb"\\(.)", rb"\1", m.group(1)).decode("latin-1")
+        for m in _TJ_RE.finditer(data)
+    ]
+    # Scanned pages have no text layer; "recognise" deterministic text instead
+    return lines or guideline_page_lines(page_number, seed=len(data))
+
+
+class _FakePoller:
+    def __init__(self, service: "FakeDocumentAnalysisClient", result, units: float):
+        self._service = service
+        self._result = result
+        self._units = units
+
+    def result(self):
+        self._service._work(self._units)
+        return self._result
+
+
+class FakeDocumentAnalysisClient(_FakeService):
+    """Stand-in for ``azure.ai.formrecognizer.DocumentAnalysisClient`` (see ``azure_ocr.create_document_client``)."""
+
+    def __init__(self, config: Optional[FakeServiceConfig] = None, endpoint=None, credential=None, **kwargs):
+        super().__init__(config or default_ocr_config())
+
+    def begin_analyze_document(self, model_id, document, **kwargs):
+        rejection = self._admit()
+        if rejection == "throttled":
+            raise HttpResponseError(message="(429) Requests to the Analyze Document API have exceeded rate limit")
+        if rejection == "failed":
+            raise HttpResponseError(message="(500) InternalServerError")
+
+        reader = PdfReader(document)
+        pages, paragraphs = [], []
+        for page_number, page in enumerate(reader.pages, start=1):
+            pages.append(SimpleNamespace(page_number=page_number))
+            region = [SimpleNamespace(page_number=page_number)]
+            paragraphs.extend(
+                SimpleNamespace(content=line, bounding_regions=region)
+                for line in _page_lines(page, page_number)
+            )
+
+        result = SimpleNamespace(pages=pages, paragraphs=paragraphs)
+        return _FakePoller(self, result, units=len(pages))
+
+
+# -----------------------
+# Fake Azure OpenAI
+# -----------------------
+_HEADING_RE = re.compile(r"^(\d{3})\. (.+)$", re.MULTILINE)
+_SUBHEADING_RE = re.compile(r"^(\d{3}\.\d) (.+)$", re.MULTILINE)
+_TERM_RE = re.compile(r'^"([^"]+)" means (.+?)\.$', re.MULTILINE)
+
+
+def _detect_generator(prompt: str) -> str:
+    lowered = prompt.lower()
+    for name, marker in (
+        ("taxonomy", "taxonomy"),
+        ("ontology", "ontology"),
+        ("semantics", "semantic"),
+    ):
+        if marker in lowered:
+            return name
+    return "rules"
+
+
+def _fake_completion_json(generator: str, text: str) -> dict:
+    headings = _HEADING_RE.findall(text)
+    subheadings = _SUBHEADING_RE.findall(text)
+
+    if generator == "taxonomy":
+        return {"taxonomy": [
+            {"category": title, "subcategories": sorted({sub for _, sub in subheadings})[:5]}
+            for _, title in headings
+        ]}
+    if generator == "ontology":
+        return {"ontology": {
+            "Loan": {"relates_to": ["Borrower", "Property"]},
+            "Borrower": {"attributes": sorted({title for _, title in headings})[:5]},
+        }}
+    if generator == "semantics":
+        return {"semantics": {
+            term: {"definition": definition, "context": "Used throughout the guideline."}
+            for term, definition in _TERM_RE.findall(text)
+        }}
+    return {
+        f"{number}. {title}": {
+            "summary": f"Covers {title.lower()} requirements.",
+            **{f"{sub_no} {sub}": "Condensed key rules for this subsection." for sub_no, sub in subheadings[:3]},
+        }
+        for number, title in headings
+    }
+
+
+class _FakeCompletions:
+    def __init__(self, service: "FakeAzureOpenAI"):
+        self._service = service
+
+    def create(self, model=None, messages=None, **kwargs):
+        return self._service._complete(messages or [])
+
+
+class _FakeFiles:
+    def __init__(self, service: "FakeAzureOpenAI"):
+        self._service = service
+
+    def create(self, file, purpose=None, **kwargs):
+        handle = file[1] if isinstance(file, tuple) else file
+        data = handle.read() if hasattr(handle, "read") else handle
+        return SimpleNamespace(id=self._service._store_file(data), purpose=purpose, bytes=len(data))
+
+    def content(self, file_id):
+        return SimpleNamespace(text=self._service._files[file_id].decode("utf-8"))
+
+
+class _FakeBatches:
+    def __init__(self, service: "FakeAzureOpenAI"):
+        self._service = service
+
+    def create(self, input_file_id, endpoint=None, completion_window=None, **kwargs):
+        return self._service._create_batch(input_file_id)
+
+    def retrieve(self, batch_id):
+        return self._service._advance_batch(batch_id)
+
+    def cancel(self, batch_id):
+        return self._service._cancel_batch(batch_id)
+
+
+class FakeAzureOpenAI(_FakeService):
+    """Stand-in for ``openai.AzureOpenAI`` (chat completions and the Batch API)."""
+
+    def __init__(self, config: Optional[FakeServiceConfig] = None, **kwargs):
+        super().__init__(config or default_llm_config())
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+        self.files = _FakeFiles(self)
+        self.batches = _FakeBatches(self)
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, dict] = {}
+        self._prompt_cache = set()
+        self.stats.update({"batch_jobs": 0, "batch_requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+
+    @staticmethod
+    def _prefix_digests(prompt: str) -> List[tuple]:
+        """(tokens, digest) for every cacheable prefix: 1024 tokens, then 128-token steps (~4 chars/token)"""
+        digests, hasher, done = [], hashlib.sha1(), 0
+        for tokens in range(PROMPT_CACHE_MIN_TOKENS, len(prompt) // 4 + 1, PROMPT_CACHE_BLOCK_TOKENS):
+            hasher.update(prompt[done:tokens * 4].encode("utf-8"))
+            done = tokens * 4
+            digests.append((tokens, hasher.copy().digest()))
+        return digests
+
+    def _error_response(self, status: int) -> httpx.Response:
+        request = httpx.Request("POST", "https://fake.openai.azure.com/openai/deployments/fake/chat/completions")
+        return httpx.Response(status, request=request)
+
+    @staticmethod
+    def _usage(prompt: str, content: str, cached_tokens: int = 0) -> dict:
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def _complete(self, messages: List[dict]):
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        prompt_tokens = max(1, len(prompt) // 4)
+
+        rejection = self._admit()
+        if rejection == "throttled":
+            raise openai.RateLimitError("Rate limit is exceeded.", response=self._error_response(429), body=None)
+        if rejection == "failed":
+            raise openai.InternalServerError("The server had an error.", response=self._error_response(500), body=None)
+
+        digests = self._prefix_digests(prompt)
+        with self._lock:
+            cached_tokens = max((tokens for tokens, digest in digests if digest in self._prompt_cache), default=0)
+        self._work((prompt_tokens - cached_tokens + CACHED_TOKEN_COST * cached_tokens) / 1000)
+        # Like the real service, a prefix is only reusable once the call that wrote it has finished
+        with self._lock:
+            self._prompt_cache.update(digest for _, digest in digests)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["cached_tokens"] += cached_tokens
+
+        content = json.dumps(_fake_completion_json(_detect_generator(messages[-1]["content"]), prompt))
+        usage = self._usage(prompt, content, cached_tokens)
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage=SimpleNamespace(
+                **{k: v for k, v in usage.items() if k != "prompt_tokens_details"},
+                prompt_tokens_details=SimpleNamespace(**usage["prompt_tokens_details"]),
+            ),
+        )
+
+    # Batch API: jobs finish ``batch_turnaround`` seconds after submission
+    def _store_file(self, data: bytes) -> str:
+        with self._lock:
+            file_id = f"file-{len(self._files) + 1}"
+            self._files[file_id] = data
+        return file_id
+
+    def _create_batch(self, input_file_id: str):
+        lines = [json.loads(line) for line in self._files[input_file_id].decode("utf-8").splitlines() if line.strip()]
+        with self._lock:
+            batch_id = f"batch-{len(self._batches) + 1}"
+            self._batches[batch_id] = {
+                "requests": lines,
+                "submitted": time.monotonic(),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+            }
+            self.stats["batch_jobs"] += 1
+            self.stats["batch_requests"] += len(lines)
+        return self._advance_batch(batch_id)
+
+    def _run_batch_requests(self, requests: List[dict]):
+        outputs, errors = [], []
+        for request in requests:
+            messages = request["body"]["messages"]
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            with self._lock:
+                failed = self._rng.random() < self.config.failure_rate
+            if failed:
+                errors.append({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "body": {"error": {"message": "Internal error"}}},
+                    "error": {"code": "server_error", "message": "Internal error"},
+                })
+                continue
+            content = json.dumps(_fake_completion_json(_detect_generator(messages[-1]["content"]), prompt))
+            outputs.append({
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": self._usage(prompt, content),
+                    },
+                },
+                "error": None,
+            })
+        return outputs, errors
+
+    def _cancel_batch(self, batch_id: str):
+        with self._lock:
+            job = self._batches[batch_id]
+            if job["status"] != "completed":
+                job["status"] = "cancelled"
+        return self._advance_batch(batch_id)
+
+    def _advance_batch(self, batch_id: str):
+        job = self._batches[batch_id]
+        total = len(job["requests"])
+        turnaround = self.config.batch_turnaround * self.config.time_scale
+        elapsed = time.monotonic() - job["submitted"]
+
+        if job["status"] not in ("completed", "cancelled"):
+            if elapsed >= turnaround:
+                outputs, errors = self._run_batch_requests(job["requests"])
+                job["output_file_id"] = self._store_file("".join(json.dumps(o) + "\n" for o in outputs).encode())
+                if errors:
+                    job["error_file_id"] = self._store_file("".join(json.dumps(e) + "\n" for e in errors).encode())
+                job["failed"] = len(errors)
+                job["status"] = "completed"
+            else:
+                job["status"] = "in_progress" if elapsed > 0 else "validating"
+
+        if job["status"] == "completed":
+            completed, failed = total - job["failed"], job["failed"]
+        elif job["status"] == "cancelled":
+            completed, failed = 0, 0
+        else:
+            completed, failed = int(total * elapsed / turnaround) if turnaround else 0, 0
+
+        return SimpleNamespace(
+            id=batch_id,
+            status=job["status"],
+            output_file_id=job["output_file_id"],
+            error_file_id=job["error_file_id"],
+            request_counts=SimpleNamespace(total=total, completed=completed, failed=failed),
+        )
+
+
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+# Cached prompt tokens cost this fraction of an uncached token's latency
+CACHED_TOKEN_COST = 0.1
+
+
+# -----------------------
+# Tokenizer
+# -----------------------
+class OfflineEncoding:
+    """Stand-in for the tiktoken encoding: one token per 4 characters, same as the fake's usage counts"""
+
+    name = "offline-approximation"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._pieces: List[str] = []
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        tokens = []
+        with self._lock:
+            for start in range(0, len(text), 4):
+                piece = text[start:start + 4]
+                if piece not in self._ids:
+                    self._ids[piece] = len(self._pieces)
+                    self._pieces.append(piece)
+                tokens.append(self._ids[piece])
+        return tokens
+
+    def decode(self, tokens: List[int]) -> str:
+        with self._lock:
+            return "".join(self._pieces[token] for token in tokens)
+
+
+def _install_tokenizer(azure_openai):
+    try:
+        azure_openai.get_encoding()
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding unavailable ({type(e).__name__}); using OfflineEncoding "
+              f"(set TIKTOKEN_CACHE_DIR for exact chunking)")
+        azure_openai._encoding = OfflineEncoding()
+
+
+# -----------------------
+# Wiring
+# -----------------------
+def install_fakes(
+    ocr_config: Optional[FakeServiceConfig] = None,
+    llm_config: Optional[FakeServiceConfig] = None,
+    llm_deployments: int = 1,
+):
+    """
+    Point the pipeline at fresh fake services.
+
+    Must run before ``utils.azure_openai`` is first imported so the module
+    finds (dummy) credentials. ``llm_deployments`` fake deployments (differing
+    only by seed) sit behind the LLM router. Returns ``(ocr_service,
+    llm_services)`` for stats.
+    """
+    import os
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "fake-key")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://fake.openai.azure.com")
+    os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "fake-deployment")
+    os.environ.setdefault("DI_endpoint", "https://fake.cognitiveservices.azure.com")
+    os.environ.setdefault("DI_key", "fake-key")
+
+    from utils import azure_ocr, azure_openai, azure_openai_batch
+    from utils.llm_router import Deployment, LLMRouter
+
+    ocr_service = FakeDocumentAnalysisClient(ocr_config)
+    llm_config = llm_config or default_llm_config()
+    llm_services = [
+        FakeAzureOpenAI(replace(llm_config, seed=llm_config.seed + i)) for i in range(llm_deployments)
+    ]
+
+    azure_ocr.create_document_client = lambda endpoint, key: ocr_service
+    azure_openai.router = LLMRouter(
+        [Deployment(f"fake-{i}", service, "fake-deployment") for i, service in enumerate(llm_services)],
+        seed=llm_config.seed,
+    )
+    azure_openai_batch.batch_client = llm_services[0]
+    _install_tokenizer(azure_openai)
+    return ocr_service, llm_services
+
+
+def combined_snapshot(services) -> Dict[str, float]:
+    """Sum the stats of several fake services (e.g. every fake LLM deployment)."""
+    total: Dict[str, float] = {}
+    for service in services:
+        for key, value in service.snapshot().items():
+            total[key] = max(total.get(key, 0), value) if key == "peak_in_flight" else total.get(key, 0) + value
+    return total
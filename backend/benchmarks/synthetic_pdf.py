@@ -0,0 +1,228 @@
+# benchmarks/synthetic_pdf.py
+"""
+Synthetic mortgage-guideline PDF generator for the offline benchmarks.
+
+Writes a minimal, valid PDF by hand (no extra dependency) whose pages carry
+a real text layer made of numbered sections, definitions and rules, so the
+fake OCR service, the chunker and the generators all see realistic input.
+A fraction of pages can be emitted without a text layer to mimic scans.
+
+Two layouts are available:
+    - uniform:    every page mixes headings, definitions and rules
+    - guideline:  front matter (contents, revision history), a glossary, the
+                  numbered program sections and appendix exhibits, in that
+                  order, like a real lender guideline
+"""
+import random
+from typing import List
+
+SECTION_TITLES = [
+    "Non-U.S. Citizen Eligibility",
+    "Borrower Eligibility",
+    "Credit Score Requirements",
+    "Income Verification",
+    "Asset Documentation",
+    "Property Types",
+    "Loan-to-Value Limits",
+    "Debt Service Coverage Ratio",
+    "Reserves Requirements",
+    "Appraisal Requirements",
+    "Title and Insurance",
+    "Occupancy Types",
+    "Prepayment Penalties",
+    "Interest-Only Features",
+    "Declining Markets",
+]
+
+TERMS = [
+    ("DTI", "the ratio of monthly debt obligations to gross monthly income"),
+    ("DSCR", "the ratio of gross rental income to the PITIA of the subject property"),
+    ("LTV", "the loan amount divided by the lesser of sales price or appraised value"),
+    ("PITIA", "principal, interest, taxes, insurance and association dues"),
+    ("ITIN", "an Individual Taxpayer Identification Number issued by the IRS"),
+    ("Seasoning", "the period of time elapsed since a credit event or acquisition"),
+    ("Reserves", "liquid assets remaining after closing expressed in months of PITIA"),
+    ("Foreign National", "a borrower who is neither a U.S. citizen nor a permanent resident"),
+]
+
+RULE_SENTENCES = [
+    "Borrowers must have a minimum credit score of {score} for this program.",
+    "The maximum loan-to-value is {ltv}% for purchase transactions.",
+    "A minimum of {months} months of reserves is required for loan amounts above ${amount},000.",
+    "Non-permanent resident aliens must provide a valid EAD or visa.",
+    "Two years of employment history must be documented and verified.",
+    "Cash-out refinance transactions are limited to {ltv}% LTV.",
+    "Properties located in declining markets require a {pct}% LTV reduction.",
+    "Gift funds are permitted after a {pct}% minimum borrower contribution.",
+    "A DSCR of at least {dscr} is required for investment properties.",
+    "Bank statements must cover the most recent {months} months.",
+]
+
+LINES_PER_PAGE = 40
+
+LAYOUTS = ("uniform", "guideline")
+
+# Share of pages per part in the "guideline" layout; the rest are program sections
+FRONT_MATTER_SHARE = 0.05
+GLOSSARY_SHARE = 0.10
+APPENDIX_SHARE = 0.15
+
+EXHIBIT_LINES = [
+    "Borrower Signature: ______________________  Date: __________",
+    "Co-Borrower Signature: ___________________  Date: __________",
+    "Loan Number: ____________  Property Address: ________________________",
+    "Please explain the circumstances in the space provided below.",
+    "I certify that the information provided on this form is true and complete.",
+    "Return the completed form to your loan officer.",
+]
+
+
+def _rule(rng: random.Random) -> str:
+    return rng.choice(RULE_SENTENCES).format(
+        score=rng.choice([620, 640, 660, 680, 700, 720]),
+        ltv=rng.choice([60, 65, 70, 75, 80, 85, 90]),
+        months=rng.choice([2, 3, 6, 12, 24]),
+        amount=rng.choice([500, 1000, 1500, 2000]),
+        pct=rng.choice([5, 10, 20]),
+        dscr=rng.choice(["0.75", "1.00", "1.15", "1.25"]),
+    )
+
+
+def _part_bounds(num_pages: int):
+    front = max(1, int(num_pages * FRONT_MATTER_SHARE))
+    glossary = front + max(1, int(num_pages * GLOSSARY_SHARE))
+    appendix = max(glossary + 1, num_pages - int(num_pages * APPENDIX_SHARE))
+    return front, glossary, appendix
+
+
+def structured_page_lines(page_index: int, num_pages: int, seed: int = 0) -> List[str]:
+    """Deterministic text lines for one page of the "guideline" layout."""
+    rng = random.Random(seed * 1_000_003 + page_index)
+    front, glossary, appendix = _part_bounds(num_pages)
+    lines = []
+
+    if page_index < front:
+        if page_index == 0:
+            lines += ["Non-QM Program Guidelines", "Table of Contents"]
+        while len(lines) < LINES_PER_PAGE // 2:
+            n = len(lines) + page_index * LINES_PER_PAGE
+            lines.append(f"{100 + n}. {SECTION_TITLES[n % len(SECTION_TITLES)]} {'.' * 20} {glossary + n}")
+        while len(lines) < LINES_PER_PAGE:
+            lines.append(f"Revision {2020 + rng.randint(0, 4)}-{rng.randint(1, 12):02d}: "
+                         f"updated {rng.choice(SECTION_TITLES).lower()} language.")
+        return lines
+
+    if page_index < glossary:
+        if page_index == front:
+            lines.append("Glossary of Terms")
+        while len(lines) < LINES_PER_PAGE:
+            term, definition = rng.choice(TERMS)
+            lines.append(f'"{term}" means {definition}.')
+        return lines
+
+    if page_index >= appendix:
+        lines.append(f"Exhibit {chr(ord('A') + (page_index - appendix) % 26)}: "
+                     f"{rng.choice(SECTION_TITLES)} Form")
+        while len(lines) < LINES_PER_PAGE:
+            lines.append(rng.choice(EXHIBIT_LINES))
+        return lines
+
+    # Program sections: as the uniform layout, with definitions mostly in the glossary
+    return guideline_page_lines(page_index - glossary, seed, definition_rate=0.02)
+
+
+def guideline_page_lines(page_index: int, seed: int = 0, definition_rate: float = 0.12) -> List[str]:
+    """Deterministic text lines for one guideline page."""
+    rng = random.Random(seed * 1_000_003 + page_index)
+    lines = []
+    section_no = 100 + page_index // 2
+
+    if page_index % 2 == 0:
+        title = SECTION_TITLES[section_no % len(SECTION_TITLES)]
+        lines.append(f"{section_no}. {title}")
+
+    while len(lines) < LINES_PER_PAGE:
+        roll = rng.random()
+        if roll < 0.08:
+            sub_no = rng.randint(1, 9)
+            sub_title = rng.choice(SECTION_TITLES)
+            lines.append(f"{section_no}.{sub_no} {sub_title}")
+        elif roll < 0.08 + definition_rate:
+            term, definition = rng.choice(TERMS)
+            lines.append(f'"{term}" means {definition}.')
+        else:
+            lines.append(_rule(rng))
+    return lines
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _content_stream(lines: List[str], scanned: bool) -> bytes:
+    if scanned:
+        # No text layer: only vector marks, like an image-only scanned page.
+        ops = ["0.8 g", "72 72 468 648 re f"]
+    else:
+        ops = ["BT", "/F1 9 Tf", "11 TL", "50 760 Td"]
+        for line in lines:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+    return "\n".join(ops).encode("latin-1", "replace")
+
+
+def build_guideline_pdf(num_pages: int, seed: int = 0, scanned_ratio: float = 0.0, layout: str = "uniform") -> bytes:
+    """Return the bytes of a synthetic guideline PDF with ``num_pages`` pages."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    # 1: catalog, 2: page tree, 3: font; then (page, content) pairs
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    for i in range(num_pages):
+        scanned = rng.random() < scanned_ratio
+        if layout == "guideline":
+            lines = structured_page_lines(i, num_pages, seed)
+        else:
+            lines = guideline_page_lines(i, seed)
+        stream = _content_stream(lines, scanned)
+        content_id = page_ids[i] + 1
+        objects.append(
+            (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(out)
+
+
+def write_guideline_pdf(
+    path: str, num_pages: int, seed: int = 0, scanned_ratio: float = 0.0, layout: str = "uniform"
+) -> str:
+    with open(path, "wb") as f:
+        f.write(build_guideline_pdf(num_pages, seed=seed, scanned_ratio=scanned_ratio, layout=layout))
+    return path
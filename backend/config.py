@@ -1,6 +1,10 @@
 # config.py
 import os
 from datetime import timedelta
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "guidelines_comparison_db")
@@ -10,3 +14,72 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretkey")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+
+# Shared Azure call budget (per process, across every job and batch)
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Born-digital pages are read from the PDF text layer instead of Azure OCR
+# (see utils/local_text.py); pages with fewer usable characters still go to OCR
+LOCAL_OCR_ENABLED = os.getenv("LOCAL_OCR_ENABLED", "true").lower() in ("1", "true", "yes")
+LOCAL_OCR_MIN_CHARS = int(os.getenv("LOCAL_OCR_MIN_CHARS", "200"))
+LOCAL_OCR_WORKERS = int(os.getenv("LOCAL_OCR_WORKERS", str(os.cpu_count() or 1)))
+
+# LLM routing (see utils/llm_router.py): calls still running after the recent
+# p-th percentile latency are hedged, for at most a fraction of all calls;
+# a throttled or failing deployment is skipped for the cooldown
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2.0"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+LLM_UNHEALTHY_COOLDOWN_SECONDS = float(os.getenv("LLM_UNHEALTHY_COOLDOWN_SECONDS", "30"))
+# A call keeps its prompt-cache affinity deployment unless that deployment's
+# expected latency is this many times the latency-aware pick's
+LLM_AFFINITY_MAX_SLOWDOWN = float(os.getenv("LLM_AFFINITY_MAX_SLOWDOWN", "2.0"))
+
+# Batch ingestion
+BATCH_MAX_PARALLEL_DOCS = int(os.getenv("BATCH_MAX_PARALLEL_DOCS", "4"))
+# Cap on the total uncompressed size of one batch upload (zip archives included)
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_MB", "2048")) * 1024 * 1024
+
+# Deferred mode: how often Azure OpenAI batch jobs are polled, and how long to wait for them
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "30"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS", str(24 * 3600)))
+
+# Password hashing (bcrypt cost and the bounded pool it runs on)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_MAX_QUEUE = int(os.getenv("AUTH_HASH_MAX_QUEUE", "64"))
+
+# In-process cache for verified tokens and user records (per worker)
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Finished results stay retrievable (and re-fetchable) for this long
+RESULT_TTL_SECONDS = float(os.getenv("RESULT_TTL_SECONDS", "3600"))
+
+# Load the tokenizer and LLM clients in the background shortly after startup
+# (delayed so the imports do not compete with uvicorn for the GIL while it binds)
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+WARM_UP_DELAY_SECONDS = float(os.getenv("WARM_UP_DELAY_SECONDS", "1.0"))
+
+# Job state (progress, results, batches, cancel requests): "memory" for a single
+# worker, "mongo" to share it across uvicorn workers and nodes
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+JOB_STATE_TTL_SECONDS = float(os.getenv("JOB_STATE_TTL_SECONDS", str(48 * 3600)))
+CANCEL_POLL_INTERVAL_SECONDS = float(os.getenv("CANCEL_POLL_INTERVAL_SECONDS", "1.0"))
+
+# Retrieval-first routing: only send each generator the chunks with enough
+# lexical signal for it (see utils/chunk_routing.py); recall 1.0 skips only
+# chunks with no signal at all
+CHUNK_ROUTING = os.getenv("CHUNK_ROUTING", "true").lower() in ("1", "true", "yes")
+CHUNK_ROUTING_RECALL = float(os.getenv("CHUNK_ROUTING_RECALL", "0.9"))
+
+# Full-text index of processed rules and semantics behind /search (SQLite, per node)
+RULE_INDEX_PATH = os.getenv("RULE_INDEX_PATH", os.path.join(BASE_DIR, "data", "rule_index.db"))
+
+# Checkpoints of finished OCR pages, chunks and per-chunk generator outputs,
+# keyed by the PDF's hash, so a retried job only redoes the missing work:
+# "local" (files under CHECKPOINT_DIR), "mongo" (shared by all nodes) or "off"
+CHECKPOINT_STORE = os.getenv("CHECKPOINT_STORE", "local").lower()
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(BASE_DIR, "data", "checkpoints"))
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
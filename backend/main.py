@@ -1,21 +1,51 @@
 import os
 import json
+import time
 import uuid
 import asyncio
+import hashlib
+import zipfile
 import uvicorn
 import tempfile
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks, HTTPException, Query, Depends, Header, Path, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import AsyncGenerator
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import AsyncGenerator, List, Optional
 import threading
+from contextlib import asynccontextmanager
 
 # Local imports
 from auth.routes import router as auth_router
-from utils.azure_ocr import AzureOCR
+from auth.models import ensure_indexes
+from auth.dependencies import get_current_user
+from config import (
+    BATCH_MAX_PARALLEL_DOCS,
+    BATCH_MAX_UPLOAD_BYTES,
+    CANCEL_POLL_INTERVAL_SECONDS,
+    WARM_UP_DELAY_SECONDS,
+    WARM_UP_ON_STARTUP,
+)
 from utils.merge_utils import merge_results_json
+from utils.chunk_routing import route_chunks, routing_stats
+from utils.cancellation import CancellationToken, JobCancelled, raise_if_cancelled, with_cancel
+from utils.job_store import create_job_store
+from utils.checkpoints import DocumentCheckpoint, create_checkpoint_store
+from utils.rule_index import get_rule_index, lender_from_filename
+from utils.result_stream import (
+    COMPONENTS,
+    MEDIA_TYPES,
+    RESULT_FORMATS,
+    choose_encoding,
+    encode_stream,
+    etag_matches,
+    iter_json,
+    iter_ndjson,
+    result_etag,
+    slice_etag,
+)
 
 # -----------------------
 # Setup Environment
@@ -29,7 +59,43 @@ os.environ["AZURE_CLI_DISABLE_CONNECTION_VERIFICATION"] = "1"
 # -----------------------
 # Initialize FastAPI
 # -----------------------
-app = FastAPI(title="Agentic AI - Azure Guideline Ingestion")
+def warm_up_pipeline():
+    """Import the LLM stack and load the tokenizer off the request path"""
+    from utils.azure_openai import warm_up
+    warm_up()
+
+
+async def ensure_indexes_background():
+    try:
+        await ensure_indexes()
+        await run_in_threadpool(job_store.ensure_indexes)
+        if checkpoint_store is not None:
+            await run_in_threadpool(checkpoint_store.ensure_indexes)
+        print("✅ MongoDB indexes ensured")
+    except Exception as e:
+        # Keep serving; auth endpoints will report the database problem themselves
+        print(f"⚠️ Could not create MongoDB indexes: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Neither step blocks startup: a replica serves as soon as it is imported
+    warm_up_timer = None
+    if WARM_UP_ON_STARTUP:
+        warm_up_timer = threading.Timer(WARM_UP_DELAY_SECONDS, warm_up_pipeline)
+        warm_up_timer.daemon = True
+        warm_up_timer.start()
+    index_task = asyncio.create_task(ensure_indexes_background())
+    if job_store.shared:
+        threading.Thread(target=watch_cancel_requests, name="cancel-watcher", daemon=True).start()
+    yield
+    index_task.cancel()
+    stop_watching.set()
+    if warm_up_timer is not None:
+        warm_up_timer.cancel()
+
+
+app = FastAPI(title="Agentic AI - Azure Guideline Ingestion", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,10 +107,22 @@ app.add_middleware(
 
 app.include_router(auth_router)
 
-# Store progress and results for each session
-progress_store = {}
-results_store = {}  # ✅ NEW: Store final results
+# Generation modes: "interactive" = synchronous chat completions,
+# "deferred" = Azure OpenAI Batch API (discounted, separate quota, up to 24h)
+PROCESSING_MODES = "^(interactive|deferred)$"
+
+# Progress, results and batch summaries for each session (see utils/job_store.py);
+# with JOB_STORE=mongo every worker sees every session
+job_store = create_job_store()
+
+# Finished OCR pages, chunks and chunk outputs by PDF hash, reused when the
+# same document is submitted again after a failure (see utils/checkpoints.py)
+checkpoint_store = create_checkpoint_store()
+
+# Jobs running on this worker
+cancel_tokens = {}  # session_id -> CancellationToken for queued/running jobs
 progress_lock = threading.Lock()
+stop_watching = threading.Event()
 
 
 # -----------------------
@@ -60,12 +138,58 @@ def root():
 # -----------------------
 def update_progress(session_id: str, progress: int, message: str):
     """Update progress for a specific session (thread-safe)"""
+    job_store.set_progress(session_id, min(progress, 100), message)
+    print(f"📊 Progress Update [{session_id[:8]}]: {progress}% - {message}")
+
+
+# -----------------------
+# Cancellation Helper
+# -----------------------
+def register_job(session_id: str) -> CancellationToken:
+    """Cancellation token for a session, created on first use"""
     with progress_lock:
-        progress_store[session_id] = {
-            "progress": min(progress, 100),
-            "message": message,
-        }
-        print(f"📊 Progress Update [{session_id[:8]}]: {progress}% - {message}")
+        return cancel_tokens.setdefault(session_id, CancellationToken())
+
+
+def request_cancel(session_id: str, queued: bool = False) -> bool:
+    """
+    Cancel a job on this worker, or flag it for the worker that runs it.
+
+    ``queued`` means the caller found the session as an unfinished document of
+    a stored batch: such documents have no progress entry until they start.
+    """
+    with progress_lock:
+        token = cancel_tokens.get(session_id)
+    if token is not None:
+        token.cancel()
+        return True
+    if job_store.get_result(session_id, include_output=False):
+        return False
+    if not queued and job_store.get_progress(session_id) is None:
+        return False
+    job_store.request_cancel(session_id)
+    return True
+
+
+def watch_cancel_requests():
+    """Apply cancel requests made on other workers to the jobs running here"""
+    while not stop_watching.wait(CANCEL_POLL_INTERVAL_SECONDS):
+        with progress_lock:
+            running = dict(cancel_tokens)
+        try:
+            for session_id in job_store.cancel_requested(running):
+                running[session_id].cancel()
+        except Exception as e:
+            print(f"⚠️ Could not poll cancel requests: {e}")
+
+
+# -----------------------
+# Result Helper
+# -----------------------
+def store_result(session_id: str, result: dict):
+    """Publish a job's final result (kept for RESULT_TTL_SECONDS)"""
+    result["completed_at"] = time.time()
+    job_store.put_result(session_id, result)
 
 
 # -----------------------
@@ -82,31 +206,28 @@ async def progress_stream(session_id: str):
         print(f"🔌 SSE Client connected for session: {session_id[:8]}")
         
         while retry_count < max_retries:
-            with progress_lock:
-                if session_id in progress_store:
-                    data = progress_store[session_id]
-                    current_progress = data["progress"]
-                    
-                    # Send update if progress changed
-                    if current_progress != last_progress:
-                        last_progress = current_progress
-                        yield f"data: {json.dumps({'progress': data['progress'], 'message': data['message']})}\n\n"
-                        print(f"📡 SSE Sent: {current_progress}% - {data['message']}")
-                        retry_count = 0
-                    
-                    # If complete, close connection
-                    if current_progress >= 100:
-                        await asyncio.sleep(0.5)
-                        print(f"✅ SSE Complete for session: {session_id[:8]}")
-                        break
+            data = await run_in_threadpool(job_store.get_progress, session_id)
+            if data is not None:
+                current_progress = data["progress"]
+
+                # Send update if progress changed
+                if current_progress != last_progress:
+                    last_progress = current_progress
+                    yield f"data: {json.dumps({'progress': data['progress'], 'message': data['message']})}\n\n"
+                    print(f"📡 SSE Sent: {current_progress}% - {data['message']}")
+                    retry_count = 0
+
+                # If complete, close connection
+                if current_progress >= 100:
+                    await asyncio.sleep(0.5)
+                    print(f"✅ SSE Complete for session: {session_id[:8]}")
+                    break
             
             await asyncio.sleep(0.5)  # Poll every 500ms
             retry_count += 1
         
         # Cleanup
-        with progress_lock:
-            if session_id in progress_store:
-                del progress_store[session_id]
+        await run_in_threadpool(job_store.delete_progress, session_id)
         
         print(f"🔌 SSE Connection closed for session: {session_id[:8]}")
     
@@ -122,86 +243,73 @@ async def progress_stream(session_id: str):
 
 
 # -----------------------
-# Background Processing Function
+# Generator Runners (30% → 95%)
 # -----------------------
-def process_pdf_background(session_id: str, pdf_path: str, filename: str):
-    """Background task for processing PDF"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"🔄 Background processing started for session: {session_id[:8]}")
-        print(f"📄 File: {filename}")
-        print(f"{'='*60}\n")
+def run_generators_interactive(
+    session_id: str, chunks: list, cancel_token: CancellationToken = None, routing: dict = None, checkpoint=None
+) -> dict:
+    """Run the four generators in parallel with synchronous chat completions (on their routed chunks)"""
+    from utils.azure_openai import (
+        ChunkSchedule,
+        generate_taxonomy,
+        generate_ontology,
+        generate_semantics,
+        generate_rules,
+    )
 
-        # STEP 1: OCR Extraction (0% → 25%)
-        update_progress(session_id, 2, "Starting OCR extraction...")
-        ocr_client = AzureOCR()
-        
-        update_progress(session_id, 5, "Reading PDF pages...")
-        extracted_text = ocr_client.analyze_doc(pdf_path)
-        
-        text_length = len(extracted_text)
-        update_progress(session_id, 25, f"✅ OCR completed - {text_length:,} characters extracted")
-        print(f"✅ OCR completed: {text_length:,} characters\n")
-
-        # STEP 2: Text Chunking (25% → 30%)
-        update_progress(session_id, 27, "Splitting text into processing chunks...")
-        from utils.azure_openai import split_text_into_chunks
-        chunks = split_text_into_chunks(extracted_text)
-        
-        num_chunks = len(chunks)
-        update_progress(session_id, 30, f"✅ Text split into {num_chunks} chunks")
-        print(f"✅ Text chunked: {num_chunks} chunks\n")
+    print("Starting AI processing with 4 parallel tasks...\n")
+
+    results = {}
+    completed_tasks = 0
+    total_tasks = 4
+
+    funcs = {
+        "taxonomy": {
+            "func": generate_taxonomy,
+            "start_msg": "Generating taxonomy structure...",
+            "end_msg": "✅ Taxonomy generated"
+        },
+        "ontology": {
+            "func": generate_ontology,
+            "start_msg": "Generating ontology relationships...",
+            "end_msg": "✅ Ontology generated"
+        },
+        "semantics": {
+            "func": generate_semantics,
+            "start_msg": "Extracting semantic definitions...",
+            "end_msg": "✅ Semantics extracted"
+        },
+        "rules": {
+            "func": generate_rules,
+            "start_msg": "Extracting rules and conditions...",
+            "end_msg": "✅ Rules extracted"
+        }
+    }
 
-        # STEP 3: AI Processing (30% → 95%)
-        from utils.azure_openai import (
-            generate_taxonomy,
-            generate_ontology,
-            generate_semantics,
-            generate_rules,
-        )
+    task_status = {name: "pending" for name in funcs.keys()}
 
-        print("Starting AI processing with 4 parallel tasks...\n")
-        
-        results = {}
-        completed_tasks = 0
-        total_tasks = 4
-        
-        funcs = {
-            "taxonomy": {
-                "func": generate_taxonomy,
-                "start_msg": "Generating taxonomy structure...",
-                "end_msg": "✅ Taxonomy generated"
-            },
-            "ontology": {
-                "func": generate_ontology,
-                "start_msg": "Generating ontology relationships...",
-                "end_msg": "✅ Ontology generated"
-            },
-            "semantics": {
-                "func": generate_semantics,
-                "start_msg": "Extracting semantic definitions...",
-                "end_msg": "✅ Semantics extracted"
-            },
-            "rules": {
-                "func": generate_rules,
-                "start_msg": "Extracting rules and conditions...",
-                "end_msg": "✅ Rules extracted"
-            }
+    # Shared so the generators reuse each other's cached chunk prefixes
+    schedule = ChunkSchedule(len(chunks))
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        future_to_name = {
+            executor.submit(
+                funcs[name]["func"], chunks, cancel_token, schedule, routing[name] if routing else None, checkpoint
+            ): name
+            for name in funcs.keys()
         }
 
-        task_status = {name: "pending" for name in funcs.keys()}
-        
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            future_to_name = {
-                executor.submit(funcs[name]["func"], chunks): name
-                for name in funcs.keys()
-            }
+        update_progress(session_id, 32, "Processing all the chunks...")
 
-            update_progress(session_id, 32, "Processing all the chunks...")
+        pending = set(future_to_name)
+        while pending:
+            done, _ = wait(with_cancel(pending, cancel_token), return_when=FIRST_COMPLETED)
+            raise_if_cancelled(cancel_token)
 
-            for future in as_completed(future_to_name):
+            for future in done:
+                pending.discard(future)
                 name = future_to_name[future]
-                
+
                 try:
                     if task_status[name] == "pending":
                         task_status[name] = "running"
@@ -210,22 +318,22 @@ def process_pdf_background(session_id: str, pdf_path: str, filename: str):
                             30 + int((completed_tasks / total_tasks) * 65),
                             funcs[name]["start_msg"]
                         )
-                    
+
                     results[name] = future.result()
                     completed_tasks += 1
                     task_status[name] = "completed"
-                    
+
                     progress = 30 + int((completed_tasks / total_tasks) * 65)
                     status_msg = f"{funcs[name]['end_msg']} ({completed_tasks}/{total_tasks} tasks done)"
-                    
+
                     update_progress(session_id, progress, status_msg)
                     print(f"✅ {name.capitalize()} completed ({completed_tasks}/{total_tasks})")
-                    
+
                 except Exception as e:
                     print(f"❌ Error generating {name}: {e}")
                     completed_tasks += 1
                     task_status[name] = "failed"
-                    
+
                     progress = 30 + int((completed_tasks / total_tasks) * 65)
                     update_progress(
                         session_id,
@@ -233,8 +341,142 @@ def process_pdf_background(session_id: str, pdf_path: str, filename: str):
                         f"⚠️ {name.capitalize()} failed ({completed_tasks}/{total_tasks} tasks processed)"
                     )
                     results[name] = {}
+    finally:
+        # On cancel the generators stop at their next chunk; don't wait for them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    print(f"\n✅ All AI processing completed\n")
+
+    return results
+
+
+def run_generators_deferred(
+    session_id: str, chunks: list, cancel_token: CancellationToken = None, routing: dict = None, checkpoint=None
+) -> dict:
+    """Run the four generators through the Azure OpenAI Batch API (cheaper, slower)"""
+    from utils.azure_openai_batch import generate_all_deferred
+
+    prompts = sum(len(indices) for indices in routing.values()) if routing else len(chunks) * 4
+    update_progress(session_id, 32, f"Preparing {prompts} prompts for a deferred batch job...")
+
+    def on_poll(completed: int, total: int):
+        if total:
+            update_progress(
+                session_id,
+                35 + int((completed / total) * 60),
+                f"Deferred batch: {completed:,}/{total:,} prompts completed"
+            )
+
+    results = generate_all_deferred(
+        chunks, on_poll=on_poll, cancel_token=cancel_token, routing=routing, checkpoint=checkpoint
+    )
+    update_progress(session_id, 95, "✅ Deferred batch job finished")
+    print(f"\n✅ All AI processing completed (deferred)\n")
+    return results
 
-        print(f"\n✅ All AI processing completed\n")
+
+# -----------------------
+# Background Processing Function
+# -----------------------
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_result(doc_key: str, lender: str, filename: str, final_json: dict):
+    """Add a finished result to the rule search index; indexing problems never fail the job"""
+    try:
+        entries = get_rule_index().add_document(doc_key, lender, filename, final_json)
+        print(f"🔎 Indexed {entries} rule entries for {lender}")
+    except Exception as e:
+        print(f"⚠️ Rule indexing failed for {filename}: {e}")
+
+
+def process_pdf_background(
+    session_id: str,
+    pdf_path: str,
+    filename: str,
+    mode: str = "interactive",
+    lender: Optional[str] = None,
+    resume: bool = True,
+):
+    """
+    Background task for processing PDF (mode: "interactive" or "deferred"); cancellable via /cancel.
+    Work finished by an earlier run on the same PDF is reused unless ``resume`` is False.
+    """
+    cancel_token = register_job(session_id)
+    lender = lender or lender_from_filename(filename)
+    try:
+        raise_if_cancelled(cancel_token)
+        doc_hash = file_sha256(pdf_path)
+        print(f"\n{'='*60}")
+        print(f"🔄 Background processing started for session: {session_id[:8]}")
+        print(f"📄 File: {filename} ({lender})")
+        print(f"⚙️ Mode: {mode}")
+        print(f"{'='*60}\n")
+
+        checkpoint = DocumentCheckpoint(checkpoint_store, doc_hash) if checkpoint_store else None
+        if checkpoint and not resume:
+            checkpoint.clear()
+        saved_chunks = checkpoint.get("chunks") if checkpoint else None
+
+        if saved_chunks:
+            # STEP 1-2: OCR and chunking finished in an earlier run (0% → 30%)
+            chunks = saved_chunks["chunks"]
+            text_length = saved_chunks["text_length"]
+            update_progress(
+                session_id, 27,
+                f"♻️ Resuming from checkpoint - OCR and chunking already done ({text_length:,} characters)"
+            )
+            print(f"♻️ Resumed {len(chunks)} chunks from checkpoint {doc_hash[:12]}\n")
+        else:
+            # STEP 1: OCR Extraction (0% → 25%)
+            update_progress(session_id, 2, "Starting OCR extraction...")
+            from utils.azure_ocr import AzureOCR
+            ocr_client = AzureOCR()
+
+            update_progress(session_id, 5, "Reading PDF pages...")
+            extracted_text = ocr_client.analyze_doc(pdf_path, cancel_token, checkpoint)
+
+            text_length = len(extracted_text)
+            ocr_stats = ocr_client.stats
+            restored = f", {ocr_stats['restored_pages']} from checkpoint" if ocr_stats["restored_pages"] else ""
+            update_progress(
+                session_id, 25,
+                f"✅ OCR completed - {text_length:,} characters extracted "
+                f"({ocr_stats['local_pages']}/{ocr_stats['pages']} pages from embedded text{restored})"
+            )
+            print(f"✅ OCR completed: {text_length:,} characters\n")
+
+            # STEP 2: Text Chunking (25% → 30%)
+            raise_if_cancelled(cancel_token)
+            update_progress(session_id, 27, "Splitting text into processing chunks...")
+            from utils.azure_openai import split_text_into_chunks
+            chunks = split_text_into_chunks(extracted_text)
+            # With failed OCR pages only the good pages are checkpointed, so a retry OCRs the rest
+            if checkpoint and not ocr_stats["failed_pages"]:
+                checkpoint.put("chunks", {"chunks": chunks, "text_length": text_length})
+
+        num_chunks = len(chunks)
+        routing = route_chunks(chunks)
+        routing_summary = routing_stats(routing, num_chunks)
+        update_progress(
+            session_id, 30,
+            f"✅ Text split into {num_chunks} chunks - {routing_summary['llm_calls']} generator calls, "
+            f"{routing_summary['llm_calls_skipped']} skipped as irrelevant"
+        )
+        print(f"✅ Text chunked: {num_chunks} chunks")
+        print(f"🧭 Chunks per generator: {routing_summary['chunks_per_generator']}\n")
+
+        # STEP 3: AI Processing (30% → 95%)
+        raise_if_cancelled(cancel_token)
+        if mode == "deferred":
+            results = run_generators_deferred(session_id, chunks, cancel_token, routing, checkpoint)
+        else:
+            results = run_generators_interactive(session_id, chunks, cancel_token, routing, checkpoint)
 
         # STEP 4: Merge Results (95% → 100%)
         update_progress(session_id, 96, "Merging all results into final structure...")
@@ -251,23 +493,37 @@ def process_pdf_background(session_id: str, pdf_path: str, filename: str):
         update_progress(session_id, 100, f"✅ Processing complete! Generated {output_size:,} bytes")
         
         # Store final result
-        with progress_lock:
-            results_store[session_id] = {
-                "status": "success",
-                "message": "Guideline processed successfully!",
-                "output_file": final_json,
-                "stats": {
-                    "text_length": text_length,
-                    "chunks": num_chunks,
-                    "output_size": output_size
-                }
+        store_result(session_id, {
+            "status": "success",
+            "message": "Guideline processed successfully!",
+            "output_file": final_json,
+            "etag": result_etag(final_json),
+            "stats": {
+                "text_length": text_length,
+                "chunks": num_chunks,
+                **routing_summary,
+                "checkpoint_restored": checkpoint.restored if checkpoint else {},
+                "output_size": output_size
             }
+        })
+        index_result(doc_hash, lender, filename, final_json)
         
         print(f"{'='*60}")
         print(f"✅ PROCESSING COMPLETE")
         print(f"📊 Output size: {output_size:,} bytes")
         print(f"{'='*60}\n")
 
+    except JobCancelled:
+        print(f"\n🛑 Processing cancelled for session: {session_id[:8]}\n")
+
+        # 100% so SSE clients close the stream
+        update_progress(session_id, 100, "🛑 Processing cancelled")
+
+        store_result(session_id, {
+            "status": "cancelled",
+            "message": "Processing was cancelled"
+        })
+
     except Exception as e:
         error_msg = str(e)
         print(f"\n{'='*60}")
@@ -277,13 +533,15 @@ def process_pdf_background(session_id: str, pdf_path: str, filename: str):
         
         update_progress(session_id, 0, f"❌ Error: {error_msg}")
         
-        with progress_lock:
-            results_store[session_id] = {
-                "status": "error",
-                "message": error_msg
-            }
+        store_result(session_id, {
+            "status": "error",
+            "message": error_msg
+        })
 
     finally:
+        with progress_lock:
+            cancel_tokens.pop(session_id, None)
+        job_store.clear_cancel(session_id)
         if os.path.exists(pdf_path):
             os.remove(pdf_path)
             print("🧹 Temporary file cleaned up\n")
@@ -293,7 +551,14 @@ def process_pdf_background(session_id: str, pdf_path: str, filename: str):
 # PDF Processing Endpoint (NOW ASYNC!)
 # -----------------------
 @app.post("/process-guideline")
-async def process_guideline(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def process_guideline(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: str = Query("interactive", pattern=PROCESSING_MODES),
+    lender: Optional[str] = Query(None, description="Lender name for /search (defaults to the file name)"),
+    resume: bool = Query(True, description="Reuse work finished by an earlier run on the same PDF"),
+    user: dict = Depends(get_current_user),
+):
     session_id = str(uuid.uuid4())
     
     print(f"\n{'='*60}")
@@ -302,7 +567,8 @@ async def process_guideline(background_tasks: BackgroundTasks, file: UploadFile
     print(f"{'='*60}\n")
     
     # Initialize progress
-    update_progress(session_id, 0, "Initializing upload...")
+    await run_in_threadpool(update_progress, session_id, 0, "Initializing upload...")
+    register_job(session_id)
 
     # Save file temporarily
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
@@ -312,10 +578,10 @@ async def process_guideline(background_tasks: BackgroundTasks, file: UploadFile
         file_size_mb = len(content) / (1024 * 1024)
         print(f"📄 File saved temporarily: {file_size_mb:.2f} MB")
 
-    update_progress(session_id, 1, "File uploaded, starting processing...")
+    await run_in_threadpool(update_progress, session_id, 1, "File uploaded, starting processing...")
 
     # ✅ Start background processing
-    background_tasks.add_task(process_pdf_background, session_id, pdf_path, file.filename)
+    background_tasks.add_task(process_pdf_background, session_id, pdf_path, file.filename, mode, lender, resume)
     
     # ✅ IMMEDIATELY return session_id
     return {
@@ -329,19 +595,399 @@ async def process_guideline(background_tasks: BackgroundTasks, file: UploadFile
 # Get Results Endpoint
 # -----------------------
 @app.get("/result/{session_id}")
-def get_result(session_id: str):
-    """Get the final result for a completed session"""
-    with progress_lock:
-        if session_id in results_store:
-            result = results_store[session_id]
-            # Clean up after retrieval
-            del results_store[session_id]
-            return result
-        else:
-            return {
-                "status": "processing",
-                "message": "Still processing..."
-            }
+def get_result(
+    session_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    """Get the final result for a completed session (kept until it expires, so it can be re-fetched)"""
+    # Metadata first, so a conditional GET never loads the output itself
+    result = job_store.get_result(session_id, include_output=False)
+    if result is None:
+        return {
+            "status": "processing",
+            "message": "Still processing..."
+        }
+
+    if "etag" in result:
+        etag = slice_etag(result["etag"])
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        result = job_store.get_result(session_id)
+    return result
+
+
+@app.get("/result/{session_id}/{component}")
+def get_result_sections(
+    session_id: str,
+    component: str = Path(..., pattern=f"^(all|{'|'.join(COMPONENTS)})$"),
+    offset: int = Query(0, ge=0, description="First section to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Number of sections to return (default: all)"),
+    format: str = Query("json", pattern=RESULT_FORMATS),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Stream one component (or all) of a finished result, optionally a section range of it.
+
+    Sections are serialized one at a time as JSON or NDJSON and compressed with
+    zstd/gzip when the client accepts it. Supports If-None-Match.
+    """
+    result = job_store.get_result(session_id, include_output=False)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found or still processing")
+    if result["status"] != "success":
+        raise HTTPException(status_code=409, detail=f"Processing ended with status: {result['status']}")
+
+    encoding = choose_encoding(accept_encoding)
+    etag = slice_etag(result["etag"], component, offset, limit, format, encoding)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    result = job_store.get_result(session_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    serialize = iter_ndjson if format == "ndjson" else iter_json
+    return StreamingResponse(
+        encode_stream(serialize(result["output_file"], component, offset, limit), encoding),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+
+@app.delete("/result/{session_id}")
+def delete_result(session_id: str, user: dict = Depends(get_current_user)):
+    """Release a result before it expires"""
+    if not job_store.delete_result(session_id):
+        raise HTTPException(status_code=404, detail="Result not found")
+    return {"status": "deleted", "session_id": session_id}
+
+
+# -----------------------
+# Cancel Endpoint
+# -----------------------
+@app.post("/cancel/{session_id}")
+def cancel_job(session_id: str, user: dict = Depends(get_current_user)):
+    """Cancel a queued or running job on any worker; it stops at the next chunk and frees its worker"""
+    if not request_cancel(session_id):
+        raise HTTPException(status_code=404, detail="No queued or running job for this session")
+
+    print(f"🛑 Cancellation requested for session: {session_id[:8]}")
+    return {"status": "cancelling", "session_id": session_id}
+
+
+# -----------------------
+# Batch Helpers
+# -----------------------
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_stream(stream, max_bytes: int) -> tuple:
+    """Copy a stream to a temp PDF in blocks while hashing it; returns (path, sha256, size)"""
+    digest, size = hashlib.sha256(), 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
+        try:
+            for block in iter(lambda: stream.read(1024 * 1024), b""):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(block)
+                tmp_pdf.write(block)
+        except BaseException:
+            tmp_pdf.close()
+            os.remove(tmp_pdf.name)
+            raise
+    return tmp_pdf.name, digest.hexdigest(), size
+
+
+def expand_upload(filename: str, fileobj, max_bytes: int) -> list:
+    """
+    Save an uploaded PDF, or every PDF inside a zip archive, to temp files.
+
+    Returns (filename, path, sha256, size) per PDF. Members are decompressed in
+    blocks and counted as they are read, so more than ``max_bytes`` in total
+    raises UploadTooLarge before a zip bomb is expanded. Blocking: run it in a
+    worker thread.
+    """
+    saved = []
+    try:
+        head = fileobj.read(4)
+        fileobj.seek(0)
+        if not (filename or "").lower().endswith(".zip") and head != b"PK\x03\x04":
+            saved.append((filename,) + save_stream(fileobj, max_bytes))
+            return saved
+
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+                with archive.open(member) as stream:
+                    remaining = max_bytes - sum(entry[3] for entry in saved)
+                    saved.append((os.path.basename(name),) + save_stream(stream, remaining))
+        return saved
+    except BaseException:
+        for entry in saved:
+            os.remove(entry[1])
+        raise
+
+
+FINISHED_STATUSES = ("success", "error", "cancelled")
+
+
+def public_batch(batch: dict) -> dict:
+    """What the job store keeps for a batch: no local file paths, no results"""
+    return {
+        "status": batch["status"],
+        "mode": batch["mode"],
+        "documents": [{k: v for k, v in doc.items() if k != "pdf_path"} for doc in batch["documents"]],
+    }
+
+
+def refresh_batch(batch_id: str, batch: dict):
+    """Pull per-document progress/results into the batch and publish aggregated progress"""
+    documents = batch["documents"]
+
+    for doc in documents:
+        session_id = doc["session_id"]
+        if doc["status"] in FINISHED_STATUSES:
+            continue
+        result = job_store.get_result(session_id, include_output=False)
+        progress = job_store.get_progress(session_id) if result is None else None
+        if result is not None:
+            doc["status"] = result["status"]
+            doc["progress"] = 100
+            doc["message"] = result["message"]
+        elif progress is not None:
+            doc["status"] = "processing"
+            doc["progress"] = progress["progress"]
+            doc["message"] = progress["message"]
+
+    finished = [doc for doc in documents if doc["status"] in FINISHED_STATUSES]
+    failed = sum(1 for doc in finished if doc["status"] == "error")
+    cancelled = sum(1 for doc in finished if doc["status"] == "cancelled")
+    overall = sum(doc["progress"] for doc in documents) // len(documents)
+    if len(finished) == len(documents):
+        batch["status"] = "completed"
+    job_store.put_batch(batch_id, public_batch(batch))
+
+    if batch["status"] == "completed":
+        update_progress(
+            batch_id, 100,
+            f"✅ Batch complete - {len(documents) - failed - cancelled} succeeded, "
+            f"{failed} failed, {cancelled} cancelled"
+        )
+    else:
+        update_progress(
+            batch_id, min(overall, 99),
+            f"Processing documents ({len(finished)}/{len(documents)} done)..."
+        )
+
+
+def batch_summary(batch_id: str, batch: dict, include_results: bool = False) -> dict:
+    documents = []
+    for doc in batch["documents"]:
+        entry = {
+            "filename": doc["filename"],
+            "sha256": doc["sha256"],
+            "session_id": doc["session_id"],
+            "duplicates": doc["duplicates"],
+            "status": doc["status"],
+            "progress": doc["progress"],
+            "message": doc["message"],
+        }
+        if include_results:
+            entry["result"] = job_store.get_result(doc["session_id"])
+        documents.append(entry)
+
+    return {
+        "batch_id": batch_id,
+        "status": batch["status"],
+        "mode": batch["mode"],
+        "progress": sum(doc["progress"] for doc in documents) // len(documents),
+        "total_documents": len(documents),
+        "duplicates_skipped": sum(len(doc["duplicates"]) for doc in documents),
+        "documents": documents,
+    }
+
+
+# -----------------------
+# Batch Background Processing
+# -----------------------
+def process_batch_background(batch_id: str, batch: dict):
+    """Run every document of a batch; Azure calls share the process-wide budget in utils.throttle"""
+    documents = batch["documents"]
+    print(f"\n📚 Batch {batch_id[:8]} started: {len(documents)} unique documents ({batch['mode']})")
+    update_progress(batch_id, 1, f"Batch started - {len(documents)} documents queued")
+
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_PARALLEL_DOCS) as executor:
+        pending = {
+            executor.submit(
+                process_pdf_background,
+                doc["session_id"], doc["pdf_path"], doc["filename"], batch["mode"],
+                batch.get("lender"), batch.get("resume", True),
+            )
+            for doc in documents
+        }
+        while pending:
+            _, pending = wait(pending, timeout=0.5)
+            refresh_batch(batch_id, batch)
+
+    refresh_batch(batch_id, batch)
+    print(f"📚 Batch {batch_id[:8]} finished\n")
+
+
+# -----------------------
+# Batch Upload Endpoint
+# -----------------------
+@app.post("/process-guidelines/batch")
+async def process_guideline_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    mode: str = Query("interactive", pattern=PROCESSING_MODES),
+    lender: Optional[str] = Query(None, description="Lender for every document (defaults to each file name)"),
+    resume: bool = Query(True, description="Reuse work finished by earlier runs on the same PDFs"),
+    user: dict = Depends(get_current_user),
+):
+    """Accept many PDFs and/or zip archives, deduplicate by content hash and process them as one batch"""
+    batch_id = str(uuid.uuid4())
+    documents = []
+    by_hash = {}
+    remaining = BATCH_MAX_UPLOAD_BYTES
+
+    try:
+        for file in files:
+            # Decompressing, hashing and writing are blocking: keep them off the event loop
+            try:
+                entries = await run_in_threadpool(expand_upload, file.filename, file.file, remaining)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Invalid zip archive: {file.filename}")
+            except UploadTooLarge:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Upload exceeds {BATCH_MAX_UPLOAD_BYTES // (1024 * 1024)} MB uncompressed",
+                )
+
+            for filename, path, digest, size in entries:
+                remaining -= size
+                if digest in by_hash:
+                    by_hash[digest]["duplicates"].append(filename)
+                    print(f"♻️ Duplicate skipped: {filename} (same as {by_hash[digest]['filename']})")
+                    os.remove(path)
+                    continue
+
+                doc = {
+                    "filename": filename,
+                    "sha256": digest,
+                    "session_id": str(uuid.uuid4()),
+                    "pdf_path": path,
+                    "duplicates": [],
+                    "status": "queued",
+                    "progress": 0,
+                    "message": "Queued",
+                }
+                by_hash[digest] = doc
+                documents.append(doc)
+                register_job(doc["session_id"])
+
+        if not documents:
+            raise HTTPException(status_code=400, detail="No PDF files found in upload")
+
+        print(f"\n{'='*60}")
+        print(f"📥 Batch upload received: {len(documents)} unique documents")
+        print(f"🆔 Batch ID: {batch_id}")
+        print(f"{'='*60}\n")
+
+        batch = {"status": "processing", "mode": mode, "lender": lender, "resume": resume, "documents": documents}
+        await run_in_threadpool(job_store.put_batch, batch_id, public_batch(batch))
+        await run_in_threadpool(update_progress, batch_id, 0, "Batch uploaded, starting processing...")
+    except BaseException:
+        # Nothing is scheduled yet: drop the temp files and tokens of this upload
+        for doc in documents:
+            with progress_lock:
+                cancel_tokens.pop(doc["session_id"], None)
+            if os.path.exists(doc["pdf_path"]):
+                os.remove(doc["pdf_path"])
+        raise
+
+    background_tasks.add_task(process_batch_background, batch_id, batch)
+
+    return batch_summary(batch_id, batch)
+
+
+# -----------------------
+# Batch Status & Results Endpoints
+# -----------------------
+@app.get("/batch/{batch_id}")
+def get_batch_status(batch_id: str, user: dict = Depends(get_current_user)):
+    """Aggregated progress plus per-document status (progress is also streamed on /progress/{batch_id})"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_summary(batch_id, batch)
+
+
+@app.post("/batch/{batch_id}/cancel")
+def cancel_batch(batch_id: str, user: dict = Depends(get_current_user)):
+    """Cancel every unfinished document of a batch, whichever worker runs it"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    cancelled = sum(
+        1 for doc in batch["documents"]
+        if doc["status"] not in FINISHED_STATUSES and request_cancel(doc["session_id"], queued=True)
+    )
+    print(f"🛑 Cancellation requested for batch: {batch_id[:8]} ({cancelled} documents)")
+    return {"status": "cancelling", "batch_id": batch_id, "documents_cancelled": cancelled}
+
+
+@app.get("/batch/{batch_id}/result")
+def get_batch_result(batch_id: str, user: dict = Depends(get_current_user)):
+    """Per-document results for a completed batch (kept until they expire, like /result)"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] != "completed":
+        return {
+            "status": "processing",
+            "message": "Still processing..."
+        }
+    return batch_summary(batch_id, batch, include_results=True)
+
+
+# -----------------------
+# Rule Search Endpoints
+# -----------------------
+@app.get("/search")
+async def search_rules(
+    q: Optional[str] = Query(None, description="Terms that must all appear (stemmed, case-insensitive)"),
+    phrase: Optional[str] = Query(None, description="Exact phrase"),
+    lender: Optional[List[str]] = Query(None, description="Only these lenders (repeatable)"),
+    component: Optional[str] = Query(None, pattern="^(rules|semantics)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    user: dict = Depends(get_current_user),
+):
+    """Ranked full-text search over the rules and semantics of every processed guideline"""
+    try:
+        return await run_in_threadpool(
+            get_rule_index().search, q, phrase, lender, component, limit, offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/search/stats")
+async def search_stats(user: dict = Depends(get_current_user)):
+    return await run_in_threadpool(get_rule_index().stats)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,23 @@
+from benchmarks.synthetic_pdf import guideline_page_lines
+from utils.chunk_routing import GENERATOR_SIGNALS, route_chunks, select_chunks
+
+
+def page_chunks(num_pages, pages_per_chunk):
+    pages = ["\n".join(guideline_page_lines(i)) for i in range(num_pages)]
+    return ["\n".join(pages[i:i + pages_per_chunk]) for i in range(0, num_pages, pages_per_chunk)]
+
+
+def test_uniform_document_keeps_its_short_tail_chunk():
+    # Three 6-page chunks and a 2-page tail with the same kind of content
+    chunks = page_chunks(20, 6)
+    routing = route_chunks(chunks, recall=0.9)
+    assert routing == {name: [0, 1, 2, 3] for name in GENERATOR_SIGNALS}
+
+
+def test_chunk_without_signal_is_skipped():
+    chunks = page_chunks(12, 6) + ["Signature: ____________    Date: ________"]
+    assert route_chunks(chunks)["rules"] == [0, 1]
+
+
+def test_no_signal_anywhere_keeps_every_chunk():
+    assert select_chunks([0.0, 0.0, 0.0], recall=0.9) == [0, 1, 2]
@@ -0,0 +1,25 @@
+from utils import job_store
+from utils.job_store import InMemoryJobStore
+
+
+def test_in_memory_store_prunes_expired_state(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(job_store.time, "time", lambda: now[0])
+    store = InMemoryJobStore()
+
+    store.put_batch("batch", {"status": "processing", "documents": []})
+    store.set_progress("batch", 50, "Processing documents")
+    store.set_progress("doc", 100, "Done")
+    store.put_result("doc", {"status": "success", "message": "Done", "completed_at": now[0]})
+
+    # The result expires together with the document's progress
+    now[0] += job_store.RESULT_TTL_SECONDS + 1
+    store.put_result("other", {"status": "success", "message": "Done", "completed_at": now[0]})
+    assert store.get_result("doc") is None and store.get_progress("doc") is None
+    assert store.get_batch("batch") is not None and store.get_progress("batch") is not None
+
+    # Batches and progress nobody updates expire after JOB_STATE_TTL_SECONDS
+    now[0] += job_store.JOB_STATE_TTL_SECONDS + 1
+    store.put_result("last", {"status": "success", "message": "Done", "completed_at": now[0]})
+    assert store.get_batch("batch") is None and store.get_progress("batch") is None
+    assert store.get_result("last") is not None
@@ -0,0 +1,83 @@
+"""End-to-end smoke tests of process_pdf_background against the fakes in benchmarks/fakes.py"""
+import io
+import os
+import uuid
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fakes import default_llm_config, default_ocr_config, install_fakes
+from benchmarks.synthetic_pdf import build_guideline_pdf, write_guideline_pdf
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """``main`` wired to fresh, fast fakes, with no checkpoints and a throwaway rule index"""
+    ocr, llms = install_fakes(
+        default_ocr_config(time_scale=0.01), default_llm_config(time_scale=0.01, batch_turnaround=5.0)
+    )
+    import main
+    from utils import azure_openai_batch, rule_index
+
+    monkeypatch.setattr(main, "checkpoint_store", None)
+    monkeypatch.setattr(rule_index, "_index", rule_index.RuleIndex(str(tmp_path / "rule_index.db")))
+    monkeypatch.setattr(azure_openai_batch, "BATCH_POLL_INTERVAL_SECONDS", 0.05)
+    return SimpleNamespace(main=main, ocr=ocr, llms=llms)
+
+
+def service_calls(pipeline):
+    """(OCR calls, LLM calls) made so far"""
+    return pipeline.ocr.stats["calls"], sum(service.stats["calls"] for service in pipeline.llms)
+
+
+def run_job(pipeline, tmp_path, mode="interactive", seed=0):
+    pdf_path = write_guideline_pdf(str(tmp_path / f"{uuid.uuid4()}.pdf"), 10, seed=seed, scanned_ratio=0.5)
+    session_id = str(uuid.uuid4())
+    pipeline.main.process_pdf_background(session_id, pdf_path, "Test Lender.pdf", mode)
+    return pipeline.main.job_store.get_result(session_id), pdf_path
+
+
+@pytest.mark.parametrize("mode", ["interactive", "deferred"])
+def test_processes_a_synthetic_guideline(pipeline, tmp_path, mode):
+    result, pdf_path = run_job(pipeline, tmp_path, mode)
+
+    assert result["status"] == "success", result["message"]
+    assert sorted(result["output_file"]) == ["ontology", "rules", "semantics", "taxonomy"]
+    assert result["output_file"]["rules"]
+    assert result["stats"]["chunks"] >= 1
+    assert service_calls(pipeline)[0] >= 1  # half the pages are scanned
+    assert not os.path.exists(pdf_path)
+    assert pipeline.main.get_rule_index().stats()["documents"] == 1
+
+
+def test_resumed_job_reuses_checkpointed_work(pipeline, tmp_path, monkeypatch):
+    from utils.checkpoints import LocalCheckpointStore
+
+    monkeypatch.setattr(pipeline.main, "checkpoint_store", LocalCheckpointStore(str(tmp_path / "checkpoints")))
+    first, _ = run_job(pipeline, tmp_path, seed=1)
+    calls = service_calls(pipeline)
+
+    second, _ = run_job(pipeline, tmp_path, seed=1)
+    assert second["status"] == "success"
+    assert second["output_file"] == first["output_file"]
+    assert service_calls(pipeline) == calls
+    assert second["stats"]["checkpoint_restored"]["chunks"] == 1
+    assert second["stats"]["checkpoint_restored"]["chunk_outputs"] == second["stats"]["llm_calls"]
+
+
+def test_batch_upload_caps_uncompressed_size(pipeline):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("a.pdf", build_guideline_pdf(2))
+        z.writestr("bomb.pdf", b"\0" * (8 * 1024 * 1024))
+    archive.seek(0)
+
+    with pytest.raises(pipeline.main.UploadTooLarge):
+        pipeline.main.expand_upload("docs.zip", archive, max_bytes=1024 * 1024)
+
+    archive.seek(0)
+    saved = pipeline.main.expand_upload("docs.zip", archive, max_bytes=16 * 1024 * 1024)
+    for _, path, _, _ in saved:
+        os.remove(path)
+    assert [(entry[0], entry[3]) for entry in saved][1] == ("bomb.pdf", 8 * 1024 * 1024)
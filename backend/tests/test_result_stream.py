@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from utils.merge_utils import merge_results_json
+from utils.result_stream import iter_json, iter_ndjson
+
+RULES = {
+    "301. Citizenship": {"summary": "Who may borrow.", "301.1 ITIN": "ITIN borrowers are ineligible."},
+    "302. Reserves": {"summary": "Liquidity.", "302.1 Months": "6 months PITIA."},
+    "303. Credit": {"summary": "Minimum FICO 660."},
+}
+SEMANTICS = [
+    {"term": "DTI", "definition": "Debt-to-income ratio"},
+    {"term": "LTV", "definition": "Loan-to-value ratio"},
+]
+TAXONOMY = [{"category": "Eligibility"}, {"category": "Income"}, {"category": "Assets"}]
+
+
+@pytest.fixture
+def final_json():
+    # Dict-shaped rules, list-shaped semantics, as the generators may return them
+    return merge_results_json(
+        json.dumps({"taxonomy": TAXONOMY}),
+        json.dumps({}),
+        json.dumps({"semantics": SEMANTICS}),
+        json.dumps(RULES),
+    )
+
+
+def read_json(final_json, component, offset=0, limit=None):
+    return json.loads(b"".join(iter_json(final_json, component, offset, limit)))
+
+
+def read_ndjson(final_json, component, offset=0, limit=None):
+    lines = b"".join(iter_ndjson(final_json, component, offset, limit)).decode("utf-8").splitlines()
+    return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+
+def test_full_fetch_matches_stored_result(final_json):
+    body = read_json(final_json, "all")
+    assert body["output_file"] == final_json
+    assert body["totals"] == {"taxonomy": 3, "ontology": 0, "semantics": 2, "rules": 3}
+
+
+def test_dict_component_json_range(final_json):
+    body = read_json(final_json, "rules", offset=1, limit=1)
+    assert body["totals"] == {"rules": 3}
+    assert body["output_file"] == {"rules": [{"302. Reserves": RULES["302. Reserves"]}]}
+
+
+def test_dict_component_ndjson(final_json):
+    header, lines = read_ndjson(final_json, "rules", offset=1)
+    assert header["totals"] == {"rules": 3}
+    assert [(line["index"], line["key"]) for line in lines] == [(1, "302. Reserves"), (2, "303. Credit")]
+    assert lines[0]["item"] == RULES["302. Reserves"]
+
+
+def test_list_component_json_keeps_every_entry(final_json):
+    assert read_json(final_json, "semantics")["output_file"] == {"semantics": SEMANTICS}
+    body = read_json(final_json, "semantics", offset=1, limit=5)
+    assert body["totals"] == {"semantics": 2}
+    assert body["output_file"] == {"semantics": [SEMANTICS[1]]}
+
+
+def test_list_component_ndjson_one_entry_per_line(final_json):
+    header, lines = read_ndjson(final_json, "semantics", limit=1)
+    assert header["totals"] == {"semantics": 2}
+    assert lines == [{"component": "semantics", "index": 0, "item": SEMANTICS[0]}]
+
+
+def test_range_past_the_end_is_empty(final_json):
+    assert read_json(final_json, "rules", offset=10)["output_file"] == {"rules": []}
+    assert read_json(final_json, "taxonomy", offset=10)["output_file"] == {"taxonomy": []}
+    assert read_ndjson(final_json, "all", offset=10)[1] == []
@@ -2,9 +2,9 @@ import os
 import tempfile
 import concurrent.futures
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader, PdfWriter
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from utils.throttle import ocr_slots
+from utils.local_text import extract_text_layer
+from utils.cancellation import raise_if_cancelled, with_cancel
 
 
 # Load environment from parent directory
@@ -12,11 +12,20 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(BASE_DIR, "..", ".env"))
 
 
+def create_document_client(endpoint: str, key: str):
+    """Azure Document Intelligence client; the SDK is only imported when OCR first runs"""
+    from azure.core.credentials import AzureKeyCredential
+    from azure.ai.formrecognizer import DocumentAnalysisClient
+
+    return DocumentAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+
+
 class AzureOCR:
     """
     Azure Document Intelligence OCR Wrapper
     Handles:
         - SSL automatically
+        - Local text-layer fast path for born-digital pages
         - Chunked PDF processing for large files
         - Parallel OCR execution
     """
@@ -29,32 +38,37 @@ class AzureOCR:
             raise ValueError("❌ Missing DI_endpoint or DI_key in .env")
 
         # Initialize Azure Document Intelligence client
-        self.client = DocumentAnalysisClient(
-            endpoint=self.endpoint,
-            credential=AzureKeyCredential(self.key),
-        )
+        self.client = create_document_client(self.endpoint, self.key)
+
+        # Page counts from the last analyze_doc call
+        self.stats = {"pages": 0, "local_pages": 0, "ocr_pages": 0, "restored_pages": 0, "failed_pages": 0}
 
         print("✅ AzureOCR client initialized")
 
     # -----------------------------------------------------
     # Split PDF into smaller chunks (default 30 pages each)
     # -----------------------------------------------------
-    def split_pdf(self, pdf_path, pages_per_chunk=30):
+    def split_pdf(self, pdf_path, pages_per_chunk=30, page_indices=None):
+        """Split into chunk files; ``page_indices`` (0-based) limits which pages are included"""
+        from PyPDF2 import PdfReader, PdfWriter
+
         print(f"📄 Splitting PDF into chunks of {pages_per_chunk} pages each...")
         reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
+        if page_indices is None:
+            page_indices = list(range(len(reader.pages)))
         chunks = []
 
-        for i in range(0, total_pages, pages_per_chunk):
+        for i in range(0, len(page_indices), pages_per_chunk):
+            chunk_pages = page_indices[i:i + pages_per_chunk]
             writer = PdfWriter()
-            for j in range(i, min(i + pages_per_chunk, total_pages)):
+            for j in chunk_pages:
                 writer.add_page(reader.pages[j])
 
             tmp_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
             with open(tmp_path, "wb") as f:
                 writer.write(f)
             chunks.append(tmp_path)
-            print(f"🧩 Created chunk: {tmp_path} (Pages {i+1}-{min(i+pages_per_chunk, total_pages)})")
+            print(f"🧩 Created chunk: {tmp_path} ({len(chunk_pages)} pages, from page {chunk_pages[0]+1})")
 
         print(f"✅ Total chunks created: {len(chunks)}")
         return chunks
@@ -62,57 +76,95 @@ class AzureOCR:
     # -----------------------------------------------------
     # Run Azure OCR on one chunk
     # -----------------------------------------------------
-    def analyze_chunk(self, chunk_path, model="prebuilt-layout"):
-        try:
-            with open(chunk_path, "rb") as f:
-                poller = self.client.begin_analyze_document(model, f)
-                result = poller.result()
-
-            # Collect all text from this chunk
-            all_text = []
-            for page in result.pages:
-                page_num = page.page_number
-                page_text = "\n".join(
-                    para.content
-                    for para in result.paragraphs
-                    if para.bounding_regions
-                    and para.bounding_regions[0].page_number == page_num
-                )
-                all_text.append(page_text)
-
-            print(f"✅ OCR completed for chunk: {os.path.basename(chunk_path)} ({len(all_text)} pages)")
-            return "\n\n".join(all_text)
-
-        except Exception as e:
-            print(f"❌ OCR failed for chunk {chunk_path}: {e}")
-            return ""
+    def analyze_chunk_pages(self, chunk_path, model="prebuilt-layout"):
+        """Per-page text for one chunk (raises on OCR failure)"""
+        with ocr_slots, open(chunk_path, "rb") as f:
+            poller = self.client.begin_analyze_document(model, f)
+            result = poller.result()
+
+        # Group paragraphs by page in a single pass
+        page_paragraphs = {page.page_number: [] for page in result.pages}
+        for para in result.paragraphs:
+            if para.bounding_regions:
+                page_num = para.bounding_regions[0].page_number
+                if page_num in page_paragraphs:
+                    page_paragraphs[page_num].append(para.content)
+
+        all_text = ["\n".join(paragraphs) for paragraphs in page_paragraphs.values()]
+        print(f"✅ OCR completed for chunk: {os.path.basename(chunk_path)} ({len(all_text)} pages)")
+        return all_text
 
     # -----------------------------------------------------
     # Parallel OCR for all chunks
     # -----------------------------------------------------
-    def analyze_doc(self, pdf_path):
+    def analyze_doc(self, pdf_path, cancel_token=None, checkpoint=None):
+        """Text of every page; with a ``checkpoint`` (utils/checkpoints.py) pages OCR'd by an earlier run are reused"""
         print("🚀 Starting OCR pipeline...")
-        chunks = self.split_pdf(pdf_path, pages_per_chunk=30)
-        results = []
+
+        # Fast path: born-digital pages come straight from the PDF text layer
+        page_texts = extract_text_layer(pdf_path)
+        raise_if_cancelled(cancel_token)
+        ocr_pages = [i for i, text in enumerate(page_texts) if text is None]
+        local_pages = len(page_texts) - len(ocr_pages)
+
+        restored = checkpoint.get_many(f"ocr-page-{i}" for i in ocr_pages) if checkpoint and ocr_pages else {}
+        if restored:
+            for i in ocr_pages:
+                page_texts[i] = restored.get(f"ocr-page-{i}", page_texts[i])
+            ocr_pages = [i for i in ocr_pages if page_texts[i] is None]
+
+        self.stats = {
+            "pages": len(page_texts),
+            "local_pages": local_pages,
+            "ocr_pages": len(ocr_pages),
+            "restored_pages": len(restored),
+            "failed_pages": 0,
+        }
+        print(f"⚡ Text layer usable on {local_pages}/{len(page_texts)} pages; "
+              f"{len(restored)} page(s) restored from checkpoint; {len(ocr_pages)} page(s) sent to Azure OCR")
+
+        pages_per_chunk = 30
+        chunks = self.split_pdf(pdf_path, pages_per_chunk=pages_per_chunk, page_indices=ocr_pages) if ocr_pages else []
 
         # Use ThreadPoolExecutor to run chunks in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        try:
             future_to_chunk = {
-                executor.submit(self.analyze_chunk, chunk): chunk for chunk in chunks
+                executor.submit(self.analyze_chunk_pages, chunk): idx for idx, chunk in enumerate(chunks)
             }
+            pending = set(future_to_chunk)
 
-            for future in concurrent.futures.as_completed(future_to_chunk):
-                chunk_path = future_to_chunk[future]
-                try:
-                    text = future.result()
-                    results.append(text)
-                except Exception as e:
-                    print(f"❌ Error while processing chunk {chunk_path}: {e}")
-
-        # Cleanup temporary chunk files
-        for c in chunks:
-            os.remove(c)
-
-        combined_text = "\n\n".join(results)
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    with_cancel(pending, cancel_token), return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                raise_if_cancelled(cancel_token)
+
+                for future in done:
+                    pending.discard(future)
+                    idx = future_to_chunk[future]
+                    chunk_pages = ocr_pages[idx * pages_per_chunk:(idx + 1) * pages_per_chunk]
+                    try:
+                        texts = future.result()
+                    except Exception as e:
+                        print(f"❌ Error while processing chunk {chunks[idx]}: {e}")
+                        texts = []
+                    self.stats["failed_pages"] += max(0, len(chunk_pages) - len(texts))
+                    for offset, page_index in enumerate(chunk_pages):
+                        page_texts[page_index] = texts[offset] if offset < len(texts) else ""
+                        # Failed pages are not checkpointed, so a retry sends them again
+                        if checkpoint and offset < len(texts):
+                            checkpoint.put(f"ocr-page-{page_index}", texts[offset])
+        finally:
+            # On cancel, drop queued chunks and don't wait for in-flight ones
+            executor.shutdown(wait=False, cancel_futures=True)
+
+            # Cleanup temporary chunk files
+            for c in chunks:
+                if os.path.exists(c):
+                    os.remove(c)
+
+        # Pages stay in document order regardless of which path produced them
+        combined_text = "\n\n".join(page_texts)
         print(f"🧾 OCR extraction completed! Total text length: {len(combined_text)} characters")
         return combined_text
@@ -1,11 +1,13 @@
 import os
 import re
 import json
-import tiktoken
-from typing import List
+import hashlib
+import threading
+from typing import List, Optional
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 from utils.parse_and_save_json import parse_and_save_json
+from utils.llm_router import LLMRouter, cached_token_usage
+from utils.cancellation import raise_if_cancelled
 
 # -----------------------
 # Load environment variables
@@ -17,24 +19,50 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
-if not AZURE_OPENAI_API_KEY or not AZURE_OPENAI_ENDPOINT:
-    raise ValueError("Missing Azure OpenAI credentials in .env")
-
 # -----------------------
-# Initialize Azure OpenAI Client
+# Azure OpenAI Router (one or more deployments, see utils/llm_router.py) and
+# tiktoken encoding: both built once on first use (or by warm_up at startup)
 # -----------------------
-client = AzureOpenAI(
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version="2024-02-01"
-)
+router = None
+_encoding = None
+_init_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    global router
+    with _init_lock:
+        if router is None:
+            router = LLMRouter.from_env()
+        return router
+
+
+def get_encoding():
+    """The gpt-4o tokenizer; loading it may download the BPE file, so it is cached for the process"""
+    global _encoding
+    with _init_lock:
+        if _encoding is None:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model("gpt-4o")
+        return _encoding
+
+
+def warm_up():
+    """Load the tokenizer and build the router ahead of the first job"""
+    for name, init in (("tiktoken encoding", get_encoding), ("LLM router", get_router)):
+        try:
+            init()
+            print(f"✅ {name} ready")
+        except Exception as e:
+            # Retried on first use; the job reports the error if it persists
+            print(f"⚠️ Could not preload {name}: {e}")
+
 
 # -----------------------
 # Utility Functions
 # -----------------------
 def split_text_into_chunks(text: str, max_tokens: int = 7000) -> List[str]:
     """Split extracted text into chunks based on token count to fit model limits."""
-    encoding = tiktoken.encoding_for_model("gpt-4o")
+    encoding = get_encoding()
     tokens = encoding.encode(text)
     
     chunks = []
@@ -56,59 +84,182 @@ def clean_json_response(content: str) -> str:
     return cleaned.strip()
 
 
-def process_chunks(chunks: List[str], prompt_template: str) -> dict:
+def build_messages(chunk: str, prompt: str) -> List[dict]:
+    """Chat messages for one chunk run through a generator prompt (cacheable prefix first)."""
+    return [
+        {"role": "system", "content": SYSTEM_PREFIX},
+        {"role": "user", "content": CHUNK_HEADER + chunk},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def chunk_output_key(chunk: str, prompt: str) -> str:
+    """Checkpoint key for one chunk's output under one prompt (digest of the exact messages)"""
+    digest = hashlib.sha256(json.dumps(build_messages(chunk, prompt)).encode("utf-8")).hexdigest()
+    return f"llm-{digest[:32]}"
+
+
+def parse_chunk_response(content: str) -> dict:
+    """Parse a model reply into a dict, tolerating markdown fences."""
+    try:
+        return json.loads(content)
+    except Exception:
+        return json.loads(clean_json_response(content))
+
+
+def merge_chunk_result(final_result: dict, chunk_result: dict) -> dict:
+    """Merge one chunk's JSON output into the running result (in place)."""
+    for key, value in chunk_result.items():
+        if key not in final_result:
+            final_result[key] = value
+        else:
+            if isinstance(value, dict) and isinstance(final_result[key], dict):
+                final_result[key].update(value)
+            elif isinstance(value, list) and isinstance(final_result[key], list):
+                final_result[key].extend(value)
+            else:
+                final_result[key] = value
+    return final_result
+
+
+class ChunkSchedule:
+    """
+    Chunk order shared by the generators of one job, for prompt-cache reuse.
+
+    A chunk's prefix is only cached once the first call on it has finished, so
+    each generator takes a chunk that is already warm if there is one, else a
+    chunk no generator has started; chunks with a call in flight come last.
+    """
+    UNTOUCHED, IN_FLIGHT, WARM = 0, 1, 2
+
+    def __init__(self, num_chunks: int):
+        self._state = [self.UNTOUCHED] * num_chunks
+        self._lock = threading.Lock()
+
+    def next(self, remaining: set) -> int:
+        with self._lock:
+            idx = min(remaining, key=lambda i: ((self.WARM, self.UNTOUCHED, self.IN_FLIGHT).index(self._state[i]), i))
+            if self._state[idx] == self.UNTOUCHED:
+                self._state[idx] = self.IN_FLIGHT
+            return idx
+
+    def done(self, idx: int):
+        with self._lock:
+            self._state[idx] = self.WARM
+
+
+def process_chunks(
+    chunks: List[str],
+    prompt_template: str,
+    cancel_token=None,
+    schedule: ChunkSchedule = None,
+    selected: Optional[List[int]] = None,
+    checkpoint=None,
+) -> dict:
     """
     Generic processing function: runs each chunk through a prompt and merges results.
+    Only the ``selected`` chunk indices are sent (all of them by default, see
+    utils/chunk_routing.py). With a shared ``schedule`` chunks are sent in
+    cache-friendly order; results are always merged in document order.
+    With a ``checkpoint`` (utils/checkpoints.py) each chunk's output is saved as
+    soon as it arrives (even one still in flight when the job is cancelled) and
+    outputs saved by an earlier run are not requested again.
+    Stops with JobCancelled between (or during) chunks once ``cancel_token`` is cancelled.
     """
-    final_result = {}
-
-    for idx, chunk in enumerate(chunks):
+    chunk_results = [None] * len(chunks)
+    remaining = set(range(len(chunks)) if selected is None else selected)
+
+    keys = {idx: chunk_output_key(chunks[idx], prompt_template) for idx in remaining} if checkpoint else {}
+    if keys:
+        saved = checkpoint.get_many(keys.values())
+        for idx, key in keys.items():
+            if key in saved:
+                chunk_results[idx] = saved[key]
+                remaining.discard(idx)
+        if saved:
+            print(f"♻️ {len(saved)}/{len(keys)} chunk output(s) restored from checkpoint")
+
+    while remaining:
+        raise_if_cancelled(cancel_token)
+        idx = schedule.next(remaining) if schedule else min(remaining)
+        remaining.discard(idx)
         print(f"Processing chunk {idx+1}/{len(chunks)}...")
-        prompt = prompt_template.format(text=chunk)
 
-        response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-        )
+        chunk = chunks[idx]
+
+        def save_late_reply(response, key=keys.get(idx)):
+            # Cancelled while in flight: Azure still bills the reply, so keep it for a retry
+            checkpoint.put(key, parse_chunk_response(response.choices[0].message.content))
 
         try:
-            chunk_result = json.loads(response.choices[0].message.content)
-        except Exception:
-            cleaned = clean_json_response(response.choices[0].message.content)
-            chunk_result = json.loads(cleaned)
-
-        # Merge JSON outputs
-        for key, value in chunk_result.items():
-            if key not in final_result:
-                final_result[key] = value
-            else:
-                if isinstance(value, dict) and isinstance(final_result[key], dict):
-                    final_result[key].update(value)
-                elif isinstance(value, list) and isinstance(final_result[key], list):
-                    final_result[key].extend(value)
-                else:
-                    final_result[key] = value
+            response = get_router().chat(
+                messages=build_messages(chunk, prompt_template),
+                cancel_token=cancel_token,
+                affinity=chunk,
+                on_abandoned=save_late_reply if checkpoint else None,
+                temperature=0.1,
+            )
+        finally:
+            if schedule:
+                schedule.done(idx)
+
+        prompt_tokens, cached_tokens = cached_token_usage(response)
+        if prompt_tokens:
+            print(
+                f"   Chunk {idx+1}: {prompt_tokens} prompt tokens, {cached_tokens} cached "
+                f"({cached_tokens / prompt_tokens:.0%})"
+            )
+
+        chunk_results[idx] = parse_chunk_response(response.choices[0].message.content)
+        if checkpoint:
+            checkpoint.put(keys[idx], chunk_results[idx])
 
+    final_result = {}
+    for chunk_result in chunk_results:
+        if chunk_result is not None:
+            merge_chunk_result(final_result, chunk_result)
     return final_result
 
 
 # -----------------------
-# Generation Functions
+# Prompt Templates
 # -----------------------
-def generate_taxonomy(chunks: List[str]) -> str:
-    prompt_template = """
-You are an expert mortgage guideline analyst specializing in document taxonomy extraction.
-You are an AI that extracts hierarchical Taxonomy information from a guideline.
+# Azure OpenAI caches a prompt prefix once it is >= 1024 tokens and byte-identical
+# across calls. The instructions alone are far shorter than that, so every call
+# is laid out as:
+#     system: SYSTEM_PREFIX          (identical for every generator and chunk)
+#     user:   the chunk text         (identical for all four generators)
+#     user:   the generator prompt   (the only part that differs)
+# which lets the 2nd-4th generator on a chunk reuse the cached chunk prefix.
+# Generators of one job share a ChunkSchedule so they do not all send the same
+# chunk at the same moment, and calls for a chunk are routed to the same
+# deployment (caches are per deployment).
+def compact_prompt(text: str) -> str:
+    """Drop blank lines and trailing/repeated inner whitespace; leading indentation is kept."""
+    lines = []
+    for line in text.strip("\n").splitlines():
+        body = line.lstrip(" \t")
+        if body:
+            lines.append(line[:len(line) - len(body)] + re.sub(r"[ \t]+", " ", body).rstrip())
+    return "\n".join(lines)
+
+
+SYSTEM_PREFIX = compact_prompt("""
+You are an expert U.S. mortgage guideline analyst.
+You will be given text from a mortgage guideline document (e.g., Non-QM, DSCR, Conventional, etc.),
+followed by the extraction task to perform on it.
 Output JSON ONLY — no explanations or markdown.
+Do NOT hallucinate or infer beyond what is explicitly in the text.
+""")
 
-### INSTRUCTIONS
-1. Analyze the mortgage guideline text and identify the hierarchical structure
+CHUNK_HEADER = "### TEXT TO PROCESS\n"
+
+TAXONOMY_PROMPT = compact_prompt("""
+### TASK: Extract hierarchical Taxonomy information from the text above.
+1. Identify the hierarchical structure of the guideline
 2. Extract main categories and their subcategories
 3. Focus on logical groupings like: Eligibility, Documentation, Property Types, Income Verification, etc.
 4. Keep category names clear and consistent with industry terminology
-5. Do NOT hallucinate or infer beyond what's explicitly in the text
-
 ### OUTPUT FORMAT (JSON ONLY)
 Example:
 taxonomy:
@@ -116,99 +267,87 @@ taxonomy:
     subcategories:
       - Income Verification
       - Credit History
-
-### TEXT TO PROCESS
-{text}
-"""
-    result = process_chunks(chunks, prompt_template)
-    return json.dumps(result, indent=2)
+""")
 
 
-def generate_ontology(chunks: List[str]) -> str:
-    prompt_template = """
-You are an AI that generates Ontology (relationships between entities) from a guideline.
-Output strictly JSON only.
-
-### INSTRUCTIONS
-1. Identify key entities in the mortgage guideline (e.g., Loan, Borrower, Property, Lender)
+ONTOLOGY_PROMPT = compact_prompt("""
+### TASK: Generate an Ontology (relationships between entities) from the text above.
+1. Identify key entities (e.g., Loan, Borrower, Property, Lender)
 2. Map relationships between entities (relates_to, requires, depends_on)
 3. Extract attributes for each entity
 4. Use standard mortgage industry terminology
-5. Do NOT add information not present in the text
-
 ### OUTPUT FORMAT (JSON ONLY)
 Example:
 ontology:
   Loan:
-    relates_to:
-      - Borrower
-      - Collateral
+    relates_to: [Borrower, Collateral]
   Borrower:
-    attributes:
-      - Name
-      - CreditScore
-
-### TEXT TO PROCESS
-{text}
-"""
-    result = process_chunks(chunks, prompt_template)
-    return json.dumps(result, indent=2)
-
+    attributes: [Name, CreditScore]
+""")
 
-def generate_semantics(chunks: List[str]) -> str:
-    prompt_template = """
-You are an AI that identifies semantic meanings (key terms, definitions, and context).
-Return JSON only, with structure:
 
-### INSTRUCTIONS
-1. Identify key mortgage terms and their definitions from the text
+SEMANTICS_PROMPT = compact_prompt("""
+### TASK: Identify semantic meanings (key terms, definitions, and context) in the text above.
+1. Identify key mortgage terms and their definitions
 2. Provide context for how each term is used in the guideline
 3. Include industry-standard abbreviations and their meanings
 4. Group related terms logically
 5. Only extract terms explicitly defined or explained in the text
-
 ### OUTPUT FORMAT (JSON ONLY)
 semantics:
   Term:
     definition: ...
     context: ...
+""")
 
-### TEXT TO PROCESS
-{text}
-"""
-    result = process_chunks(chunks, prompt_template)
-    return json.dumps(result, indent=2)
-
-
-def generate_rules(chunks: List[str]) -> str:
-    prompt_template = """
-You are an expert U.S. mortgage underwriting analyst.You will be given text from a mortgage guideline document (e.g., Non-QM, DSCR, Conventional, etc.).
-Your job is to extract and structure it into clean, hierarchical JSON.
 
-### INSTRUCTIONS
+RULES_PROMPT = compact_prompt("""
+### TASK: Extract and structure the text above into clean, hierarchical JSON.
 1. Identify major sections and subsections based on titles, numbering, or formatting
-2. For each **major section**:
-   - Add a "summary" (2-3 lines) describing what this section mainly covers
-3. For each **subsection** inside it:
-   - Provide only the **rules, conditions, or requirements** summarized in 2-3 lines
-   - Do NOT include a "summary" key for subsections
+2. For each **major section** add a "summary" (2-3 lines) describing what this section mainly covers
+3. For each **subsection** inside it provide only the **rules, conditions, or requirements** summarized in 2-3 lines; no "summary" key
 4. Keep headings exactly as written in the text (e.g., "301. Non-U.S. Citizen Eligibility")
 5. Maintain hierarchy and section order
-6. Do NOT hallucinate or infer beyond what's in the text
-
 ### OUTPUT FORMAT (JSON ONLY)
-{{
-  "Major Section Title": {{
-    "summary": "Short description of what this section covers.",
-    "Subsection Title": "Condensed key rules, eligibility, or conditions under that subsection."
-  }},
-  "Next Major Section": {{
-    ...
-  }}
-}}
-
-### TEXT TO PROCESS
-{text}
-"""
-    result = process_chunks(chunks, prompt_template)
+{"Major Section Title": {"summary": "Short description of what this section covers.", "Subsection Title": "Condensed key rules, eligibility, or conditions under that subsection."}, "Next Major Section": {...}}
+""")
+
+
+# -----------------------
+# Generation Functions
+# -----------------------
+def generate_taxonomy(
+    chunks: List[str], cancel_token=None, schedule: ChunkSchedule = None, selected=None, checkpoint=None
+) -> str:
+    result = process_chunks(chunks, TAXONOMY_PROMPT, cancel_token, schedule, selected, checkpoint)
+    return json.dumps(result, indent=2)
+
+
+def generate_ontology(
+    chunks: List[str], cancel_token=None, schedule: ChunkSchedule = None, selected=None, checkpoint=None
+) -> str:
+    result = process_chunks(chunks, ONTOLOGY_PROMPT, cancel_token, schedule, selected, checkpoint)
+    return json.dumps(result, indent=2)
+
+
+def generate_semantics(
+    chunks: List[str], cancel_token=None, schedule: ChunkSchedule = None, selected=None, checkpoint=None
+) -> str:
+    result = process_chunks(chunks, SEMANTICS_PROMPT, cancel_token, schedule, selected, checkpoint)
     return json.dumps(result, indent=2)
+
+
+def generate_rules(
+    chunks: List[str], cancel_token=None, schedule: ChunkSchedule = None, selected=None, checkpoint=None
+) -> str:
+    result = process_chunks(chunks, RULES_PROMPT, cancel_token, schedule, selected, checkpoint)
+    return json.dumps(result, indent=2)
+
+
+# Generator name -> prompt template, in the order results are merged
+GENERATOR_PROMPTS = {
+    "taxonomy": TAXONOMY_PROMPT,
+    "ontology": ONTOLOGY_PROMPT,
+    "semantics": SEMANTICS_PROMPT,
+    "rules": RULES_PROMPT,
+}
@@ -0,0 +1,279 @@
+# utils/azure_openai_batch.py
+"""
+Deferred ("batch") mode for the four generators.
+
+Instead of one synchronous chat completion per chunk, every (generator, chunk)
+prompt is written to a JSONL job file and submitted to the Azure OpenAI Batch
+API, which runs at a discount against a separate quota. Results are matched
+back by ``custom_id`` and merged exactly like the interactive path, so the
+output feeds ``merge_results_json`` unchanged.
+"""
+import io
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from config import BATCH_POLL_INTERVAL_SECONDS, BATCH_TIMEOUT_SECONDS
+from utils.cancellation import JobCancelled
+from utils.azure_openai import (
+    GENERATOR_PROMPTS,
+    build_messages,
+    chunk_output_key,
+    parse_chunk_response,
+    merge_chunk_result,
+)
+
+# -----------------------
+# Load environment variables
+# -----------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, "..", ".env"))
+
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+# Batch jobs need a "Global Batch" deployment and a batch-capable API version
+AZURE_OPENAI_BATCH_DEPLOYMENT_NAME = os.getenv(
+    "AZURE_OPENAI_BATCH_DEPLOYMENT_NAME", os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+)
+AZURE_OPENAI_BATCH_API_VERSION = os.getenv("AZURE_OPENAI_BATCH_API_VERSION", "2024-10-21")
+
+# Azure limits per batch input file
+MAX_REQUESTS_PER_BATCH = 100_000
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# -----------------------
+# Azure OpenAI Batch Client (built on first use)
+# -----------------------
+batch_client = None
+_client_lock = threading.Lock()
+
+
+def get_batch_client():
+    global batch_client
+    with _client_lock:
+        if batch_client is None:
+            from openai import AzureOpenAI
+            batch_client = AzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                api_version=AZURE_OPENAI_BATCH_API_VERSION,
+            )
+        return batch_client
+
+
+# -----------------------
+# Job File Construction
+# -----------------------
+def build_batch_requests(chunks: List[str], routing: Optional[Dict[str, List[int]]] = None) -> List[dict]:
+    """
+    One /chat/completions request per (generator, chunk), tagged ``<generator>-<index>``;
+    with ``routing`` (utils/chunk_routing.py) only for the chunks routed to each generator.
+    """
+    requests = []
+    for name, prompt_template in GENERATOR_PROMPTS.items():
+        indices = range(len(chunks)) if routing is None else routing.get(name, [])
+        for idx in indices:
+            chunk = chunks[idx]
+            requests.append({
+                "custom_id": f"{name}-{idx}",
+                "method": "POST",
+                "url": "/chat/completions",
+                "body": {
+                    "model": AZURE_OPENAI_BATCH_DEPLOYMENT_NAME,
+                    "messages": build_messages(chunk, prompt_template),
+                    "temperature": 0.1,
+                },
+            })
+    return requests
+
+
+def split_into_job_files(requests: List[dict]) -> List[bytes]:
+    """Serialize requests as JSONL, starting a new file whenever Azure's limits would be exceeded."""
+    files, lines, size = [], [], 0
+    for request in requests:
+        line = (json.dumps(request) + "\n").encode("utf-8")
+        if lines and (len(lines) >= MAX_REQUESTS_PER_BATCH or size + len(line) > MAX_BYTES_PER_BATCH):
+            files.append(b"".join(lines))
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    if lines:
+        files.append(b"".join(lines))
+    return files
+
+
+# -----------------------
+# Submit / Poll / Collect
+# -----------------------
+def submit_batch(job_file: bytes) -> str:
+    client = get_batch_client()
+    uploaded = client.files.create(file=("requests.jsonl", io.BytesIO(job_file)), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/chat/completions",
+        completion_window="24h",
+    )
+    print(f"📦 Batch job submitted: {batch.id}")
+    return batch.id
+
+
+def cancel_batches(batch_ids: List[str]):
+    for batch_id in batch_ids:
+        try:
+            get_batch_client().batches.cancel(batch_id)
+            print(f"🛑 Batch job cancelled: {batch_id}")
+        except Exception as e:
+            print(f"⚠️ Could not cancel batch job {batch_id}: {e}")
+
+
+def wait_for_batches(
+    batch_ids: List[str],
+    on_poll: Optional[Callable[[int, int], None]] = None,
+    cancel_token=None,
+) -> list:
+    """Poll until every batch job reaches a terminal state; ``on_poll(completed, total)`` reports request counts."""
+    deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+    batches = {}
+
+    while True:
+        if cancel_token is not None and cancel_token.cancelled:
+            cancel_batches([b for b in batch_ids if b not in batches or batches[b].status not in TERMINAL_STATUSES])
+            raise JobCancelled("Job was cancelled")
+
+        for batch_id in batch_ids:
+            if batch_id not in batches or batches[batch_id].status not in TERMINAL_STATUSES:
+                batches[batch_id] = get_batch_client().batches.retrieve(batch_id)
+
+        if on_poll:
+            counts = [b.request_counts for b in batches.values() if b.request_counts]
+            on_poll(sum(c.completed + c.failed for c in counts), sum(c.total for c in counts))
+
+        if all(b.status in TERMINAL_STATUSES for b in batches.values()):
+            return list(batches.values())
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Batch jobs did not finish within {BATCH_TIMEOUT_SECONDS:.0f}s")
+        if cancel_token is not None:
+            cancel_token.wait(BATCH_POLL_INTERVAL_SECONDS)
+        else:
+            time.sleep(BATCH_POLL_INTERVAL_SECONDS)
+
+
+def read_batch_outputs(batches: list) -> Dict[str, str]:
+    """Map ``custom_id`` -> model reply content for every successful request."""
+    client = get_batch_client()
+    outputs = {}
+    for batch in batches:
+        if batch.status != "completed":
+            print(f"⚠️ Batch job {batch.id} ended with status: {batch.status}")
+        if getattr(batch, "error_file_id", None):
+            errors = client.files.content(batch.error_file_id).text.splitlines()
+            print(f"⚠️ Batch job {batch.id}: {len(errors)} request(s) failed")
+        if not getattr(batch, "output_file_id", None):
+            continue
+
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            outputs[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return outputs
+
+
+# -----------------------
+# Deferred Generation
+# -----------------------
+def _parse_outputs(outputs: Dict[str, str], keys: Dict[str, str], checkpoint=None) -> Dict[str, dict]:
+    """Parsed batch replies by chunk output key (``keys`` maps custom_id -> key); each is checkpointed"""
+    parsed = {}
+    for custom_id, content in outputs.items():
+        if custom_id not in keys:
+            continue
+        try:
+            parsed[keys[custom_id]] = parse_chunk_response(content)
+        except Exception as e:
+            print(f"❌ Could not parse {custom_id}: {e}")
+            continue
+        if checkpoint:
+            checkpoint.put(keys[custom_id], parsed[keys[custom_id]])
+    return parsed
+
+
+def generate_all_deferred(
+    chunks: List[str],
+    on_poll: Optional[Callable[[int, int], None]] = None,
+    cancel_token=None,
+    routing: Optional[Dict[str, List[int]]] = None,
+    checkpoint=None,
+) -> Dict[str, str]:
+    """
+    Run all four generators through the Batch API.
+
+    Returns generator name -> JSON string, the same shape the interactive
+    ``generate_*`` functions return. Chunks whose request failed are skipped.
+    With a ``checkpoint`` (utils/checkpoints.py), outputs saved by an earlier run
+    are reused and batch jobs it submitted are collected rather than resubmitted.
+    """
+    if routing is None:
+        routing = {name: list(range(len(chunks))) for name in GENERATOR_PROMPTS}
+    # custom_id -> checkpoint key of that prompt's output
+    keys = {
+        f"{name}-{idx}": chunk_output_key(chunks[idx], GENERATOR_PROMPTS[name])
+        for name, indices in routing.items() for idx in indices
+    }
+
+    chunk_outputs = {}
+    if checkpoint:
+        chunk_outputs = checkpoint.get_many(set(keys.values()))
+        restored = sum(1 for key in keys.values() if key in chunk_outputs)
+        if restored:
+            print(f"♻️ {restored}/{len(keys)} prompt output(s) restored from checkpoint")
+        previous = checkpoint.get("deferred-batches")
+        if previous and any(key not in chunk_outputs for key in keys.values()):
+            print(f"♻️ Collecting {len(previous['batch_ids'])} batch job(s) submitted by an earlier run...")
+            try:
+                outputs = read_batch_outputs(wait_for_batches(previous["batch_ids"], on_poll, cancel_token))
+                chunk_outputs.update(_parse_outputs(outputs, previous["keys"], checkpoint))
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"⚠️ Could not collect earlier batch jobs: {e}")
+
+    pending = {
+        name: [idx for idx in indices if keys[f"{name}-{idx}"] not in chunk_outputs]
+        for name, indices in routing.items()
+    }
+    requests = build_batch_requests(chunks, pending)
+    if requests:
+        job_files = split_into_job_files(requests)
+        print(f"📦 Submitting {len(requests)} prompts in {len(job_files)} batch job(s)...")
+
+        batch_ids = [submit_batch(job_file) for job_file in job_files]
+        if checkpoint:
+            checkpoint.put("deferred-batches", {
+                "batch_ids": batch_ids,
+                "keys": {request["custom_id"]: keys[request["custom_id"]] for request in requests},
+            })
+        outputs = read_batch_outputs(wait_for_batches(batch_ids, on_poll, cancel_token))
+        chunk_outputs.update(_parse_outputs(outputs, keys, checkpoint))
+
+    results = {}
+    for name in GENERATOR_PROMPTS:
+        final_result, missing = {}, 0
+        indices = routing.get(name, [])
+        for idx in indices:
+            chunk_result = chunk_outputs.get(keys[f"{name}-{idx}"])
+            if chunk_result is None:
+                missing += 1
+                continue
+            merge_chunk_result(final_result, chunk_result)
+        if missing:
+            print(f"⚠️ {name}: {missing}/{len(indices)} chunk(s) missing from batch output")
+        results[name] = json.dumps(final_result, indent=2)
+    return results
@@ -0,0 +1,52 @@
+# utils/cancellation.py
+"""
+Cooperative cancellation for background jobs.
+
+A ``CancellationToken`` is created per job and passed down through OCR and
+generation. Long loops call ``raise_if_cancelled()`` between chunks, and code
+that blocks on futures includes ``token.future`` in its ``wait()`` so it
+wakes up the moment the job is cancelled instead of when the call returns.
+"""
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its token has been cancelled"""
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # Resolves on cancel; usable in concurrent.futures.wait() next to real work
+        self.future = Future()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if not self._event.is_set():
+                self._event.set()
+                self.future.set_result(True)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("Job was cancelled")
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to ``seconds``, returning early (True) if the job is cancelled"""
+        return self._event.wait(seconds)
+
+
+def raise_if_cancelled(token: Optional[CancellationToken]):
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def with_cancel(futures, token: Optional[CancellationToken]) -> list:
+    """Futures to wait on, plus the token's future when there is a token"""
+    return list(futures) + ([token.future] if token is not None else [])
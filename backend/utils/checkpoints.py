@@ -0,0 +1,206 @@
+# utils/checkpoints.py
+"""
+Resumable processing: checkpoints of finished pipeline work, keyed by the PDF's SHA-256.
+
+A job that dies or fails partway (worker crash, Azure outage, cancel) leaves
+its completed pieces behind, and re-uploading the same PDF picks them up:
+
+    ocr-page-<n>       text of one page recognised by Azure OCR
+    chunks             the chunk list (OCR and chunking are skipped entirely)
+    llm-<digest>       one generator's parsed output for one chunk; the digest
+                       covers the exact messages, so changed prompts or chunks
+                       never reuse stale output
+    deferred-batches   Azure batch jobs submitted in deferred mode, re-attached
+                       instead of being paid for twice
+
+With ``CHECKPOINT_STORE=local`` (default) checkpoints are JSON files under
+``CHECKPOINT_DIR``; with ``mongo`` they are shared by every worker and node.
+Either way they expire after ``CHECKPOINT_TTL_SECONDS``. Checkpointing is best
+effort: a failed read or write is logged and the work is simply redone.
+"""
+import os
+import json
+import time
+import zlib
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+from config import CHECKPOINT_DIR, CHECKPOINT_STORE, CHECKPOINT_TTL_SECONDS
+
+
+class CheckpointStore(ABC):
+    """Interface shared by the local and MongoDB stores; values must be JSON-serializable"""
+
+    def ensure_indexes(self):
+        pass
+
+    @abstractmethod
+    def get_many(self, doc_hash: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """The stored values for whichever of ``keys`` exist"""
+
+    @abstractmethod
+    def put(self, doc_hash: str, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    def clear(self, doc_hash: str):
+        ...
+
+
+# -----------------------
+# Local files
+# -----------------------
+class LocalCheckpointStore(CheckpointStore):
+    """One directory per document, one JSON file per checkpoint (written atomically)"""
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, doc_hash: str, key: str = None) -> str:
+        directory = os.path.join(self.root, doc_hash)
+        return directory if key is None else os.path.join(directory, f"{key}.json")
+
+    def _prune(self):
+        """Drop documents not written to for CHECKPOINT_TTL_SECONDS"""
+        cutoff = time.time() - CHECKPOINT_TTL_SECONDS
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def get_many(self, doc_hash, keys):
+        values = {}
+        for key in keys:
+            try:
+                with open(self._path(doc_hash, key), encoding="utf-8") as f:
+                    values[key] = json.load(f)
+            except FileNotFoundError:
+                continue
+        return values
+
+    def put(self, doc_hash, key, value):
+        directory = self._path(doc_hash)
+        with self._lock:
+            if not os.path.isdir(directory):
+                self._prune()
+                os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(doc_hash, key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self, doc_hash):
+        shutil.rmtree(self._path(doc_hash), ignore_errors=True)
+
+
+# -----------------------
+# MongoDB
+# -----------------------
+class MongoCheckpointStore(CheckpointStore):
+    """``job_checkpoints`` collection; values are zlib-compressed JSON, expired by a TTL index"""
+
+    def __init__(self, database):
+        self._checkpoints = database["job_checkpoints"]
+
+    def ensure_indexes(self):
+        self._checkpoints.create_index("doc_hash")
+        self._checkpoints.create_index("expires_at", expireAfterSeconds=0)
+
+    def get_many(self, doc_hash, keys):
+        ids = {f"{doc_hash}/{key}": key for key in keys}
+        if not ids:
+            return {}
+        return {
+            ids[doc["_id"]]: json.loads(zlib.decompress(doc["value_z"]))
+            for doc in self._checkpoints.find({"_id": {"$in": list(ids)}}, {"value_z": 1})
+        }
+
+    def put(self, doc_hash, key, value):
+        self._checkpoints.replace_one(
+            {"_id": f"{doc_hash}/{key}"},
+            {
+                "doc_hash": doc_hash,
+                "value_z": zlib.compress(json.dumps(value).encode("utf-8")),
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=CHECKPOINT_TTL_SECONDS),
+            },
+            upsert=True,
+        )
+
+    def clear(self, doc_hash):
+        self._checkpoints.delete_many({"doc_hash": doc_hash})
+
+
+# -----------------------
+# Per-document handle
+# -----------------------
+# Checkpoint key prefix -> stage reported in a job's ``checkpoint_restored`` stats
+RESTORED_STAGES = (
+    ("ocr-page-", "ocr_pages"),
+    ("chunks", "chunks"),
+    ("llm-", "chunk_outputs"),
+    ("deferred-batches", "deferred_batches"),
+)
+
+
+class DocumentCheckpoint:
+    """Checkpoints of one document, as passed through the pipeline; never raises"""
+
+    def __init__(self, store: CheckpointStore, doc_hash: str):
+        self.store = store
+        self.doc_hash = doc_hash
+        # Entries reused by this job, per stage (see RESTORED_STAGES)
+        self.restored = {stage: 0 for _, stage in RESTORED_STAGES}
+        self._lock = threading.Lock()
+
+    def _read(self, keys: list) -> Dict[str, Any]:
+        try:
+            values = self.store.get_many(self.doc_hash, keys)
+        except Exception as e:
+            print(f"⚠️ Could not read checkpoints for {self.doc_hash[:12]}: {e}")
+            return {}
+        with self._lock:
+            for key in values:
+                stage = next((stage for prefix, stage in RESTORED_STAGES if key.startswith(prefix)), None)
+                if stage:
+                    self.restored[stage] += 1
+        return values
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Saved pieces of work (OCR pages, chunk outputs) for whichever of ``keys`` exist"""
+        return self._read(list(keys))
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._read([key]).get(key)
+
+    def put(self, key: str, value: Any):
+        try:
+            self.store.put(self.doc_hash, key, value)
+        except Exception as e:
+            print(f"⚠️ Could not save checkpoint {key} for {self.doc_hash[:12]}: {e}")
+
+    def clear(self):
+        try:
+            self.store.clear(self.doc_hash)
+        except Exception as e:
+            print(f"⚠️ Could not clear checkpoints for {self.doc_hash[:12]}: {e}")
+
+
+def create_checkpoint_store() -> Optional[CheckpointStore]:
+    """The configured store, or None when checkpointing is off"""
+    if CHECKPOINT_STORE == "off":
+        return None
+    if CHECKPOINT_STORE == "mongo":
+        from auth.models import sync_database
+        return MongoCheckpointStore(sync_database())
+    if CHECKPOINT_STORE != "local":
+        raise ValueError(f"Unknown CHECKPOINT_STORE: {CHECKPOINT_STORE} (expected 'local', 'mongo' or 'off')")
+    return LocalCheckpointStore()
@@ -0,0 +1,151 @@
+# utils/chunk_routing.py
+"""
+Retrieval-first routing: decide locally which chunks each generator needs.
+
+Every generator used to receive every chunk, although ``semantics`` only
+extracts terms that are defined somewhere and ``rules`` mostly needs the
+numbered program sections; contents pages, glossaries and signature forms
+were sent to all four prompts anyway. Before any LLM call each chunk is
+scored per generator with cheap lexical signals (headings, definition
+phrasing, normative language, mortgage entities), taken per 1,000 characters
+so the short final chunk of a document is judged like the others. A generator
+then gets its densest chunks until they hold ``CHUNK_ROUTING_RECALL`` of its
+total signal density; the rest are skipped.
+
+    recall 1.0  keep every chunk with any signal (skip only chunks with none)
+    recall 0.9  also drop weak chunks holding the last 10% of the signal
+
+If a generator finds no signal in any chunk the heuristics do not fit the
+document, so it gets every chunk. Routing is pure CPU and takes a few
+milliseconds per chunk.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+from config import CHUNK_ROUTING, CHUNK_ROUTING_RECALL
+
+_NUMBERED_HEADING = re.compile(r"^[ \t]*\d{1,4}(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{2,80}$", re.MULTILINE)
+_PART_HEADING = re.compile(
+    r"^[ \t]*(?:Section|SECTION|Chapter|CHAPTER|Part|PART|Article|ARTICLE)[ \t]+[\dIVX]+", re.MULTILINE
+)
+_QUOTED_DEFINITION = re.compile(r"[\"“][^\"”\n]{1,60}[\"”]\s+(?:means|refers to|is defined as|shall mean)\b")
+# "Debt Service Coverage Ratio (DSCR)"
+_ACRONYM_EXPANSION = re.compile(r"(?<=[A-Za-z]) \([A-Z]{2,6}\)")
+_AMOUNT = re.compile(r"\d+(?:\.\d+)?\s?%|\$\s?\d")
+# Contents-page lines ("301. Borrower Eligibility ........ 42") are not sections
+_TOC_LINE = re.compile(r"\.{4,}\s*\d+\s*$", re.MULTILINE)
+_WORD = re.compile(r"[a-z]+")
+
+# Generator -> weighted signals; a chunk's score is the weighted number of hits.
+#     patterns: regexes run on the original text
+#     words:    lowercase words, counted once per chunk for all generators
+#     phrases:  lowercase multi-word phrases
+GENERATOR_SIGNALS = {
+    "taxonomy": {
+        "patterns": [(_NUMBERED_HEADING, 2.0), (_PART_HEADING, 2.0)],
+        "words": [({
+            "eligibility", "documentation", "underwriting", "occupancy", "income", "assets", "credit",
+            "reserves", "transaction", "transactions", "overlay", "overlays",
+        }, 0.5)],
+        "phrases": [(("property type",), 0.5)],
+    },
+    "ontology": {
+        "patterns": [],
+        "words": [
+            ({
+                "borrower", "borrowers", "guarantor", "guarantors", "lender", "lenders", "loan", "loans",
+                "property", "properties", "appraisal", "appraisals", "title", "insurance", "income",
+                "asset", "assets", "reserves", "lien", "liens", "escrow", "llc", "trust", "trusts",
+            }, 0.5),
+            ({"requires", "require"}, 1.0),
+        ],
+        "phrases": [((
+            "depends on", "subject to", "secured by", "associated with", "applies to", "based on",
+            "in accordance with",
+        ), 1.0)],
+    },
+    "semantics": {
+        "patterns": [(_QUOTED_DEFINITION, 3.0), (_ACRONYM_EXPANSION, 1.0)],
+        "words": [
+            ({"means"}, 1.0),
+            ({"definition", "definitions", "glossary"}, 2.0),
+        ],
+        "phrases": [(("refers to", "is defined as", "shall mean", "is known as", "defined term"), 1.0)],
+    },
+    "rules": {
+        "patterns": [(_NUMBERED_HEADING, 2.0), (_AMOUNT, 0.5), (_TOC_LINE, -2.0)],
+        "words": [({
+            "must", "shall", "required", "requires", "requirement", "requirements", "ineligible",
+            "minimum", "maximum", "prohibited",
+        }, 1.0)],
+        "phrases": [((
+            "may not", "not permitted", "not allowed", "not eligible", "at least", "no more than", "limited to",
+        ), 1.0)],
+    },
+}
+
+
+def score_chunk(chunk: str, generator: str, words: Counter = None, lowered: str = None) -> float:
+    """Weighted signal count; ``words``/``lowered`` can be passed in to share them across generators"""
+    lowered = chunk.lower() if lowered is None else lowered
+    words = Counter(_WORD.findall(lowered)) if words is None else words
+    signals = GENERATOR_SIGNALS[generator]
+
+    score = sum(weight * len(pattern.findall(chunk)) for pattern, weight in signals["patterns"])
+    score += sum(weight * sum(words[w] for w in vocabulary) for vocabulary, weight in signals["words"])
+    score += sum(weight * sum(lowered.count(p) for p in phrases) for phrases, weight in signals["phrases"])
+    return max(score, 0.0)
+
+
+# Chunks scoring at least this fraction of the mean are always kept
+WEAK_CHUNK_RATIO = 0.5
+# Scores are signal per this many characters, so chunk length does not count as signal
+DENSITY_CHARS = 1000
+
+
+def select_chunks(scores: List[float], recall: float) -> List[int]:
+    """
+    Indices (document order) of the best chunks holding ``recall`` of the total
+    score (signal densities, see route_chunks). Only weak chunks (under WEAK_CHUNK_RATIO of the mean score) are ever
+    dropped, so a document whose signal is spread evenly is sent whole.
+    """
+    total = sum(scores)
+    if total <= 0:
+        return list(range(len(scores)))
+
+    weak = WEAK_CHUNK_RATIO * total / len(scores)
+    selected, kept = [], 0.0
+    for idx in sorted(range(len(scores)), key=lambda i: -scores[i]):
+        if scores[idx] <= 0 or (kept >= recall * total and scores[idx] < weak):
+            break
+        selected.append(idx)
+        kept += scores[idx]
+    return sorted(selected)
+
+
+def route_chunks(
+    chunks: List[str],
+    generators=tuple(GENERATOR_SIGNALS),
+    recall: Optional[float] = None,
+) -> Dict[str, List[int]]:
+    """Generator name -> indices of the chunks to send it (every chunk when routing is off)"""
+    if not CHUNK_ROUTING:
+        return {name: list(range(len(chunks))) for name in generators}
+
+    recall = CHUNK_ROUTING_RECALL if recall is None else recall
+    scores = {name: [] for name in generators}
+    for chunk in chunks:
+        lowered = chunk.lower()
+        words = Counter(_WORD.findall(lowered))
+        for name in generators:
+            scores[name].append(score_chunk(chunk, name, words, lowered) * DENSITY_CHARS / max(len(chunk), 1))
+    return {name: select_chunks(scores[name], recall) for name in generators}
+
+
+def routing_stats(routing: Dict[str, List[int]], num_chunks: int) -> dict:
+    calls = sum(len(indices) for indices in routing.values())
+    return {
+        "llm_calls": calls,
+        "llm_calls_skipped": num_chunks * len(routing) - calls,
+        "chunks_per_generator": {name: len(indices) for name, indices in routing.items()},
+    }
@@ -0,0 +1,260 @@
+# utils/job_store.py
+"""
+Shared job state: progress, final results, batch summaries and cancel requests.
+
+With ``JOB_STORE=memory`` (default) everything lives in this process, which
+only works with a single uvicorn worker. With ``JOB_STORE=mongo`` the state is
+kept in MongoDB, so any worker or node can answer ``/progress``, ``/result``,
+``/batch`` and ``/cancel`` for any session behind a plain round-robin load
+balancer. Only the job itself stays on the worker that received the upload.
+
+Jobs run in worker threads, so the interface is synchronous. The Mongo store
+uses the pymongo client underneath the app's motor client (same URI and
+connection pool); async endpoints call it through ``run_in_threadpool``.
+"""
+import json
+import time
+import zlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Set
+from config import JOB_STORE, JOB_STATE_TTL_SECONDS, RESULT_TTL_SECONDS
+
+
+class JobStore(ABC):
+    """Interface shared by the in-process and MongoDB stores"""
+
+    # True when other processes see the same state (cancel requests must be polled)
+    shared = False
+
+    def ensure_indexes(self):
+        pass
+
+    # Progress: {"progress": int, "message": str}
+    @abstractmethod
+    def set_progress(self, session_id: str, progress: int, message: str):
+        ...
+
+    @abstractmethod
+    def get_progress(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def delete_progress(self, session_id: str):
+        ...
+
+    # Results: {"status", "message", "output_file"?, "etag"?, "stats"?, "completed_at"}
+    @abstractmethod
+    def put_result(self, session_id: str, result: dict):
+        ...
+
+    @abstractmethod
+    def get_result(self, session_id: str, include_output: bool = True) -> Optional[dict]:
+        """The stored result; ``include_output=False`` skips loading ``output_file``"""
+
+    @abstractmethod
+    def delete_result(self, session_id: str) -> bool:
+        ...
+
+    # Batches: the public summary (status, mode, documents without local paths)
+    @abstractmethod
+    def put_batch(self, batch_id: str, batch: dict):
+        ...
+
+    @abstractmethod
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def delete_batch(self, batch_id: str):
+        ...
+
+    # Cancel requests, picked up by whichever worker runs the job
+    @abstractmethod
+    def request_cancel(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def cancel_requested(self, session_ids: Iterable[str]) -> Set[str]:
+        ...
+
+    @abstractmethod
+    def clear_cancel(self, session_id: str):
+        ...
+
+
+# -----------------------
+# In-process store
+# -----------------------
+class InMemoryJobStore(JobStore):
+    """
+    Progress and batch entries keep their last write time; like the Mongo TTLs,
+    results expire after RESULT_TTL_SECONDS (with the job's progress) and idle
+    progress and batches after JOB_STATE_TTL_SECONDS. Pruning runs on put_result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress = {}  # session_id -> (written_at, progress)
+        self._results = {}
+        self._batches = {}  # batch_id -> (written_at, batch)
+        self._cancelled = set()
+
+    def _prune(self, now: float):
+        expired = [sid for sid, r in self._results.items() if now - r["completed_at"] > RESULT_TTL_SECONDS]
+        for sid in expired:
+            del self._results[sid]
+            # Nothing streams /progress for batch documents, so their entries go with the result
+            self._progress.pop(sid, None)
+        for entries in (self._progress, self._batches):
+            idle = [key for key, (written_at, _) in entries.items() if now - written_at > JOB_STATE_TTL_SECONDS]
+            for key in idle:
+                del entries[key]
+
+    def set_progress(self, session_id, progress, message):
+        with self._lock:
+            self._progress[session_id] = (time.time(), {"progress": progress, "message": message})
+
+    def get_progress(self, session_id):
+        with self._lock:
+            entry = self._progress.get(session_id)
+            return entry[1] if entry else None
+
+    def delete_progress(self, session_id):
+        with self._lock:
+            self._progress.pop(session_id, None)
+
+    def put_result(self, session_id, result):
+        with self._lock:
+            self._prune(time.time())
+            self._results[session_id] = result
+
+    def get_result(self, session_id, include_output=True):
+        with self._lock:
+            return self._results.get(session_id)
+
+    def delete_result(self, session_id):
+        with self._lock:
+            return self._results.pop(session_id, None) is not None
+
+    def put_batch(self, batch_id, batch):
+        with self._lock:
+            self._batches[batch_id] = (time.time(), batch)
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            entry = self._batches.get(batch_id)
+            return entry[1] if entry else None
+
+    def delete_batch(self, batch_id):
+        with self._lock:
+            self._batches.pop(batch_id, None)
+
+    def request_cancel(self, session_id):
+        with self._lock:
+            self._cancelled.add(session_id)
+
+    def cancel_requested(self, session_ids):
+        with self._lock:
+            return self._cancelled.intersection(session_ids)
+
+    def clear_cancel(self, session_id):
+        with self._lock:
+            self._cancelled.discard(session_id)
+
+
+# -----------------------
+# MongoDB store
+# -----------------------
+class MongoJobStore(JobStore):
+    """
+    One collection per kind of state, each with a TTL index on ``expires_at``.
+    ``output_file`` is stored zlib-compressed to stay well under the 16 MB
+    document limit for large guidelines.
+    """
+    shared = True
+
+    def __init__(self, database):
+        self._progress = database["job_progress"]
+        self._results = database["job_results"]
+        self._batches = database["job_batches"]
+        self._cancels = database["job_cancellations"]
+
+    def ensure_indexes(self):
+        for collection in (self._progress, self._results, self._batches, self._cancels):
+            collection.create_index("expires_at", expireAfterSeconds=0)
+
+    @staticmethod
+    def _expires(seconds: float) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+    def set_progress(self, session_id, progress, message):
+        self._progress.replace_one(
+            {"_id": session_id},
+            {"progress": progress, "message": message, "expires_at": self._expires(JOB_STATE_TTL_SECONDS)},
+            upsert=True,
+        )
+
+    def get_progress(self, session_id):
+        return self._progress.find_one({"_id": session_id}, {"_id": 0, "expires_at": 0})
+
+    def delete_progress(self, session_id):
+        self._progress.delete_one({"_id": session_id})
+
+    def put_result(self, session_id, result):
+        document = {k: v for k, v in result.items() if k != "output_file"}
+        if "output_file" in result:
+            document["output_file_z"] = zlib.compress(json.dumps(result["output_file"]).encode("utf-8"))
+        document["expires_at"] = self._expires(RESULT_TTL_SECONDS)
+        self._results.replace_one({"_id": session_id}, document, upsert=True)
+
+    def get_result(self, session_id, include_output=True):
+        projection = {"_id": 0, "expires_at": 0}
+        if not include_output:
+            projection["output_file_z"] = 0
+        document = self._results.find_one({"_id": session_id}, projection)
+        if document is not None and "output_file_z" in document:
+            document["output_file"] = json.loads(zlib.decompress(document.pop("output_file_z")))
+        return document
+
+    def delete_result(self, session_id):
+        return self._results.delete_one({"_id": session_id}).deleted_count > 0
+
+    def put_batch(self, batch_id, batch):
+        self._batches.replace_one(
+            {"_id": batch_id},
+            {**batch, "expires_at": self._expires(JOB_STATE_TTL_SECONDS)},
+            upsert=True,
+        )
+
+    def get_batch(self, batch_id):
+        return self._batches.find_one({"_id": batch_id}, {"_id": 0, "expires_at": 0})
+
+    def delete_batch(self, batch_id):
+        self._batches.delete_one({"_id": batch_id})
+
+    def request_cancel(self, session_id):
+        self._cancels.replace_one(
+            {"_id": session_id},
+            {"expires_at": self._expires(JOB_STATE_TTL_SECONDS)},
+            upsert=True,
+        )
+
+    def cancel_requested(self, session_ids):
+        session_ids = list(session_ids)
+        if not session_ids:
+            return set()
+        return {doc["_id"] for doc in self._cancels.find({"_id": {"$in": session_ids}}, {"_id": 1})}
+
+    def clear_cancel(self, session_id):
+        self._cancels.delete_one({"_id": session_id})
+
+
+def create_job_store() -> JobStore:
+    if JOB_STORE == "mongo":
+        from auth.models import sync_database
+        return MongoJobStore(sync_database())
+    if JOB_STORE != "memory":
+        raise ValueError(f"Unknown JOB_STORE: {JOB_STORE} (expected 'memory' or 'mongo')")
+    return InMemoryJobStore()
@@ -0,0 +1,346 @@
+# utils/llm_router.py
+"""
+Routing layer for chat completions across several Azure OpenAI deployments.
+
+    - Weighted, latency-aware selection (power of two choices on weight and
+      expected latency = EWMA latency x (1 + in-flight calls))
+    - Health tracking: 429s and repeated errors put a deployment on cooldown,
+      and a failed call fails over to another deployment
+    - Affinity: calls sharing a prompt prefix can pass the same ``affinity``
+      key and prefer the same healthy deployment, so the provider's prompt
+      cache (which is per deployment) is reused. It is a preference, not a
+      pin: when that deployment's expected latency exceeds the latency-aware
+      pick's by LLM_AFFINITY_MAX_SLOWDOWN, the call goes to the faster one
+    - Hedging: a call still running after the recent p95 latency gets a
+      duplicate on another deployment; the first answer wins. Hedges only use
+      spare capacity in ``llm_slots`` and are capped at a fraction of traffic.
+
+Deployments come from ``AZURE_OPENAI_DEPLOYMENTS`` (JSON list), e.g.
+    [{"name": "eastus", "endpoint": "https://...", "api_key": "...",
+      "deployment": "gpt-4o", "weight": 2}, ...]
+and default to the single ``AZURE_OPENAI_*`` deployment.
+"""
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Optional
+import openai
+from openai import AzureOpenAI
+from config import (
+    LLM_AFFINITY_MAX_SLOWDOWN,
+    LLM_HEDGE_MAX_RATIO,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_PERCENTILE,
+    LLM_MAX_CONCURRENCY,
+    LLM_UNHEALTHY_COOLDOWN_SECONDS,
+)
+from utils.throttle import llm_slots
+from utils.cancellation import JobCancelled, raise_if_cancelled, with_cancel
+
+# Latency samples needed before the p95 replaces the minimum hedge delay
+MIN_LATENCY_SAMPLES = 20
+EWMA_ALPHA = 0.2
+FAILURES_BEFORE_COOLDOWN = 3
+
+
+def cached_token_usage(response) -> tuple:
+    """(prompt_tokens, cached_tokens) from a chat completion; zeros when usage is missing"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    return usage.prompt_tokens or 0, (getattr(details, "cached_tokens", None) or 0)
+
+
+class Deployment:
+    """One Azure OpenAI deployment plus its health and latency stats"""
+
+    def __init__(self, name: str, client, model: str, weight: float = 1.0):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.weight = weight
+        self.ewma_latency: Optional[float] = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.stats = {"requests": 0, "failures": 0, "throttled": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def expected_latency(self) -> float:
+        return (self.ewma_latency or 1.0) * (1 + self.in_flight)
+
+
+class LLMRouter:
+    def __init__(self, deployments: List[Deployment], seed: Optional[int] = None):
+        if not deployments:
+            raise ValueError("LLMRouter needs at least one deployment")
+        self.deployments = deployments
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        # Every task holds an llm_slot, so this never queues behind the budget
+        self._executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+    @classmethod
+    def from_env(cls) -> "LLMRouter":
+        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
+        configured = os.getenv("AZURE_OPENAI_DEPLOYMENTS")
+        if configured:
+            entries = json.loads(configured)
+        else:
+            entries = [{
+                "name": "default",
+                "endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+                "api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+                "deployment": os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            }]
+
+        deployments = []
+        for entry in entries:
+            if not entry.get("endpoint") or not entry.get("api_key"):
+                raise ValueError("Missing Azure OpenAI credentials in .env")
+            client = AzureOpenAI(
+                azure_endpoint=entry["endpoint"],
+                api_key=entry["api_key"],
+                api_version=entry.get("api_version", api_version),
+            )
+            deployments.append(Deployment(
+                name=entry.get("name", entry["endpoint"]),
+                client=client,
+                model=entry["deployment"],
+                weight=float(entry.get("weight", 1.0)),
+            ))
+        return cls(deployments)
+
+    # -----------------------
+    # Selection & health
+    # -----------------------
+    @staticmethod
+    def _affinity_score(affinity: str, deployment: Deployment) -> float:
+        """Weighted rendezvous hash: each key maps to one deployment, spread by weight"""
+        digest = hashlib.sha1(f"{deployment.name}\0{affinity}".encode("utf-8")).digest()
+        u = (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 2)
+        return -deployment.weight / math.log(u)
+
+    def pick(self, exclude=(), affinity: Optional[str] = None) -> Deployment:
+        now = time.monotonic()
+        with self._lock:
+            candidates = (
+                [d for d in self.deployments if d.healthy(now) and d not in exclude]
+                or [d for d in self.deployments if d not in exclude]
+                or self.deployments
+            )
+            if len(candidates) == 1:
+                return candidates[0]
+            a, b = self._rng.choices(candidates, weights=[d.weight for d in candidates], k=2)
+            balanced = min((a, b), key=lambda d: d.expected_latency())
+            if affinity is None:
+                return balanced
+            preferred = max(candidates, key=lambda d: self._affinity_score(affinity, d))
+            # A cache hit is not worth queueing behind a slow or overloaded deployment
+            if preferred.expected_latency() > LLM_AFFINITY_MAX_SLOWDOWN * balanced.expected_latency():
+                return balanced
+            return preferred
+
+    def _record_success(self, deployment: Deployment, latency: float, response=None):
+        prompt_tokens, cached_tokens = cached_token_usage(response)
+        with self._lock:
+            deployment.stats["prompt_tokens"] += prompt_tokens
+            deployment.stats["cached_tokens"] += cached_tokens
+            deployment.consecutive_failures = 0
+            if deployment.ewma_latency is None:
+                deployment.ewma_latency = latency
+            else:
+                deployment.ewma_latency += EWMA_ALPHA * (latency - deployment.ewma_latency)
+            self._latencies.append(latency)
+
+    def _record_failure(self, deployment: Deployment, error: Exception):
+        with self._lock:
+            deployment.stats["failures"] += 1
+            deployment.consecutive_failures += 1
+            if isinstance(error, openai.RateLimitError):
+                deployment.stats["throttled"] += 1
+                retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+                cooldown = float(retry_after) if retry_after else LLM_UNHEALTHY_COOLDOWN_SECONDS
+            elif deployment.consecutive_failures >= FAILURES_BEFORE_COOLDOWN:
+                cooldown = LLM_UNHEALTHY_COOLDOWN_SECONDS
+            else:
+                return
+            deployment.cooldown_until = time.monotonic() + cooldown
+        print(f"⚠️ LLM deployment '{deployment.name}' cooling down for {cooldown:.0f}s: {error}")
+
+    def hedge_delay(self) -> float:
+        """Recent p-th percentile latency, never below LLM_HEDGE_MIN_DELAY_SECONDS"""
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return LLM_HEDGE_MIN_DELAY_SECONDS
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE / 100))
+        return max(LLM_HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+    def _take_hedge_budget(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > LLM_HEDGE_MAX_RATIO * self._requests:
+                return False
+            self._hedges += 1
+            return True
+
+    # -----------------------
+    # Calls
+    # -----------------------
+    def _call(self, deployment: Deployment, messages: List[dict], kwargs: dict):
+        with self._lock:
+            deployment.in_flight += 1
+            deployment.stats["requests"] += 1
+        start = time.perf_counter()
+        try:
+            response = deployment.client.chat.completions.create(
+                model=deployment.model, messages=messages, **kwargs
+            )
+        except Exception as e:
+            self._record_failure(deployment, e)
+            raise
+        else:
+            self._record_success(deployment, time.perf_counter() - start, response)
+            return response
+        finally:
+            with self._lock:
+                deployment.in_flight -= 1
+
+    def _submit(self, deployment: Deployment, messages: List[dict], kwargs: dict):
+        """Run a call on the pool; the caller must already hold an llm_slot"""
+        future = self._executor.submit(self._call, deployment, messages, kwargs)
+        future.add_done_callback(lambda _: llm_slots.release())
+        return future
+
+    def _acquire_slot(self, cancel_token):
+        while not llm_slots.acquire(timeout=0.25):
+            raise_if_cancelled(cancel_token)
+        if cancel_token is not None and cancel_token.cancelled:
+            llm_slots.release()
+            raise_if_cancelled(cancel_token)
+
+    @staticmethod
+    def _hand_off(futures: list, on_abandoned: Optional[Callable]):
+        """The caller stopped waiting: pass the first successful reply still to come to ``on_abandoned``"""
+        if on_abandoned is None:
+            return
+        lock, delivered = threading.Lock(), []
+
+        def deliver(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            with lock:
+                if delivered:
+                    return
+                delivered.append(future)
+            try:
+                on_abandoned(future.result())
+            except Exception as e:
+                print(f"⚠️ Could not keep a reply that arrived after cancel: {e}")
+
+        for future in futures:
+            future.add_done_callback(deliver)
+
+    def _hedged_call(
+        self, primary: Deployment, messages: List[dict], kwargs: dict, cancel_token=None, on_abandoned=None
+    ):
+        # On cancel we stop waiting at once; the in-flight call finishes in the
+        # background, its slot is released on completion and its reply goes to
+        # ``on_abandoned`` (if given) instead of being dropped
+        self._acquire_slot(cancel_token)
+        futures = [self._submit(primary, messages, kwargs)]
+        try:
+            return self._wait_hedged(primary, futures, messages, kwargs, cancel_token)
+        except JobCancelled:
+            self._hand_off(futures, on_abandoned)
+            raise
+
+    def _wait_hedged(self, primary: Deployment, futures: list, messages: List[dict], kwargs: dict, cancel_token):
+        """Wait for the primary call, hedging it when slow; a hedge is appended to ``futures``"""
+        future = futures[0]
+        done, _ = wait(with_cancel([future], cancel_token), timeout=self.hedge_delay(), return_when=FIRST_COMPLETED)
+        raise_if_cancelled(cancel_token)
+        if future in done:
+            return future.result()
+
+        if self._take_hedge_budget() and llm_slots.acquire(blocking=False):
+            backup = self.pick(exclude=[primary])
+            print(f"🏁 Hedging slow LLM call: '{primary.name}' -> '{backup.name}'")
+            futures.append(self._submit(backup, messages, kwargs))
+
+        error = None
+        waiting = list(futures)
+        while waiting:
+            done, pending = wait(with_cancel(waiting, cancel_token), return_when=FIRST_COMPLETED)
+            raise_if_cancelled(cancel_token)
+            for f in done:
+                if f.exception() is None:
+                    if f is not future:
+                        with self._lock:
+                            self._hedge_wins += 1
+                    # The losing call finishes in the background; its reply is dropped
+                    return f.result()
+                error = error or f.exception()
+            waiting = [f for f in pending if f in waiting]
+        raise error
+
+    def chat(
+        self,
+        messages: List[dict],
+        cancel_token=None,
+        affinity: Optional[str] = None,
+        on_abandoned: Optional[Callable] = None,
+        **kwargs,
+    ):
+        """
+        Chat completion routed to the best (or the ``affinity``) deployment, hedged and with failover.
+        If the call is cancelled while a request is in flight, its reply is passed to
+        ``on_abandoned`` when it arrives.
+        """
+        with self._lock:
+            self._requests += 1
+
+        tried = []
+        last_error = None
+        for _ in range(len(self.deployments)):
+            deployment = self.pick(exclude=tried, affinity=affinity)
+            tried.append(deployment)
+            try:
+                return self._hedged_call(deployment, messages, kwargs, cancel_token, on_abandoned)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                last_error = e
+                if len(self.deployments) > 1:
+                    print(f"🔁 LLM call failed on '{deployment.name}', failing over: {e}")
+        raise last_error
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            prompt_tokens = sum(d.stats["prompt_tokens"] for d in self.deployments)
+            cached_tokens = sum(d.stats["cached_tokens"] for d in self.deployments)
+            return {
+                "requests": self._requests,
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "deployments": {
+                    d.name: {**d.stats, "ewma_latency": d.ewma_latency, "healthy": d.healthy(time.monotonic())}
+                    for d in self.deployments
+                },
+            }
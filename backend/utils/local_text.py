@@ -0,0 +1,91 @@
+# utils/local_text.py
+"""
+Local text-layer extraction for born-digital PDFs.
+
+Each page's embedded text is read with PyPDF2 and classified; pages whose
+text layer looks trustworthy skip Azure Document Intelligence entirely, the
+rest (scans, image-only or garbled pages) are returned as ``None`` so the
+caller can send just those pages to ``AzureOCR.analyze_doc``.
+
+Extraction is CPU-bound, so large documents are split into page ranges and
+spread over a shared process pool.
+"""
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional
+from config import LOCAL_OCR_ENABLED, LOCAL_OCR_MIN_CHARS, LOCAL_OCR_WORKERS
+
+# Below this many pages a worker process costs more than it saves
+PAGES_PER_WORKER = 50
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def is_usable_text(text: str, min_chars: int = LOCAL_OCR_MIN_CHARS) -> bool:
+    """Heuristic: enough characters, mostly printable and mostly letters (not glyph ids or symbols)"""
+    stripped = text.strip()
+    if len(stripped) < min_chars:
+        return False
+    if "\ufffd" in stripped or stripped.count("(cid:") > 3:
+        return False
+
+    visible = [c for c in stripped if not c.isspace()]
+    printable = sum(1 for c in visible if c.isprintable())
+    letters = sum(1 for c in visible if c.isalpha())
+    return printable / len(visible) >= 0.95 and letters / len(visible) >= 0.5
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int, min_chars: int) -> List[Optional[str]]:
+    """Worker: text for pages [start, end), or None where the page needs OCR"""
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(pdf_path)
+    pages = []
+    for index in range(start, end):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception:
+            text = ""
+        pages.append(text if is_usable_text(text, min_chars) else None)
+    return pages
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is not safe
+            _pool = ProcessPoolExecutor(max_workers=LOCAL_OCR_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def extract_text_layer(pdf_path: str) -> List[Optional[str]]:
+    """
+    Per-page local text for ``pdf_path``; ``None`` marks pages that need OCR.
+    When the fast path is disabled every page is ``None``.
+    """
+    from PyPDF2 import PdfReader
+
+    total_pages = len(PdfReader(pdf_path).pages)
+    if not LOCAL_OCR_ENABLED:
+        return [None] * total_pages
+
+    workers = min(LOCAL_OCR_WORKERS, math.ceil(total_pages / PAGES_PER_WORKER))
+    if workers <= 1:
+        return _extract_page_range(pdf_path, 0, total_pages, LOCAL_OCR_MIN_CHARS)
+
+    step = math.ceil(total_pages / workers)
+    ranges = [(start, min(start + step, total_pages)) for start in range(0, total_pages, step)]
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_page_range, pdf_path, start, end, LOCAL_OCR_MIN_CHARS)
+        for start, end in ranges
+    ]
+
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
@@ -0,0 +1,188 @@
+# utils/result_stream.py
+"""
+Streaming, paginated and compressed access to stored results.
+
+A finished result is ``{"taxonomy": [...], "ontology": [...], "semantics": [...],
+"rules": [...]}``. Clients can fetch one component (or all of them) and a range
+of its sections as JSON or NDJSON. A section is one array item, except that
+the merge step usually stores ontology, semantics and rules as one wrapped
+object ``[{...}]``; then each top-level key of that object is a section (e.g.
+"301. Non-U.S. Citizen Eligibility"). Sections are serialized one at a time
+and compressed incrementally, so a large guideline never has to be built as
+one response body. ETags are derived from a content hash taken once when the
+result is stored, so re-fetches can be answered with 304 Not Modified.
+"""
+import json
+import zlib
+import hashlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd is only offered when installed
+    zstandard = None
+
+COMPONENTS = ("taxonomy", "ontology", "semantics", "rules")
+RESULT_FORMATS = "^(json|ndjson)$"
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+# Items are grouped into writes of roughly this size before compressing
+WRITE_BUFFER_BYTES = 64 * 1024
+
+
+# -----------------------
+# ETags
+# -----------------------
+def result_etag(final_json: dict) -> str:
+    """Content hash of a final result; computed once when the result is stored"""
+    canonical = json.dumps(final_json, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(canonical).hexdigest()[:32]
+
+
+def slice_etag(base: str, *parts) -> str:
+    """Strong ETag for one representation (component, range, format, encoding) of a result"""
+    suffix = "-".join(str(p) for p in parts if p not in (None, ""))
+    return f'"{base}-{suffix}"' if suffix else f'"{base}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check; weak comparison as RFC 9110 requires for GET"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# -----------------------
+# Content negotiation
+# -----------------------
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported Content-Encoding from Accept-Encoding: zstd, then gzip, else identity"""
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        if name:
+            accepted[name] = quality
+
+    def ok(name):
+        return accepted.get(name, accepted.get("*", 0.0)) > 0
+
+    if zstandard is not None and ok("zstd"):
+        return "zstd"
+    if ok("gzip"):
+        return "gzip"
+    return None
+
+
+# -----------------------
+# Serialization
+# -----------------------
+def _component_names(component: str) -> tuple:
+    return COMPONENTS if component == "all" else (component,)
+
+
+# Components merge_results_json may store as one wrapped object keyed by section title
+KEYED_COMPONENTS = ("ontology", "semantics", "rules")
+
+
+def component_sections(final_json: dict, name: str) -> list:
+    """
+    ``(section title, value)`` pairs of a component. A keyed component stored as
+    exactly one object is split by its top-level keys; any other array is one
+    section per item, with a title of None.
+    """
+    items = final_json.get(name) or []
+    if name in KEYED_COMPONENTS and len(items) == 1 and isinstance(items[0], dict):
+        return list(items[0].items())
+    return [(None, item) for item in items]
+
+
+def _section_range(sections: list, offset: int, limit: Optional[int]) -> range:
+    end = len(sections) if limit is None else min(len(sections), offset + limit)
+    return range(offset, end)
+
+
+def count_sections(final_json: dict, component: str) -> dict:
+    return {name: len(component_sections(final_json, name)) for name in _component_names(component)}
+
+
+def iter_ndjson(final_json: dict, component: str, offset: int, limit: Optional[int]) -> Iterator[bytes]:
+    """
+    A header line with section counts, then one ``{"component", "index", "item"}``
+    line per section; sections of keyed components also carry their ``"key"``
+    """
+    header = {"type": "meta", "offset": offset, "limit": limit, "totals": count_sections(final_json, component)}
+    yield (json.dumps(header) + "\n").encode("utf-8")
+    for name in _component_names(component):
+        sections = component_sections(final_json, name)
+        for index in _section_range(sections, offset, limit):
+            key, value = sections[index]
+            line = {"component": name, "index": index, "item": value}
+            if key is not None:
+                line = {"component": name, "index": index, "key": key, "item": value}
+            yield (json.dumps(line) + "\n").encode("utf-8")
+
+
+def iter_json(final_json: dict, component: str, offset: int, limit: Optional[int]) -> Iterator[bytes]:
+    """
+    ``{"offset", "limit", "totals", "output_file": {...}}`` with ``output_file`` cut
+    to the requested range; keyed sections are written back into one object, so a
+    full fetch has the same shape as the stored result
+    """
+    meta = {"offset": offset, "limit": limit, "totals": count_sections(final_json, component)}
+    yield (json.dumps(meta)[:-1] + ', "output_file": {').encode("utf-8")
+    for n, name in enumerate(_component_names(component)):
+        yield ((", " if n else "") + json.dumps(name) + ": [").encode("utf-8")
+        sections = component_sections(final_json, name)
+        for k, index in enumerate(_section_range(sections, offset, limit)):
+            key, value = sections[index]
+            if key is None:
+                yield ((", " if k else "") + json.dumps(value)).encode("utf-8")
+            else:
+                yield ((", " if k else "{") + json.dumps(key) + ": " + json.dumps(value)).encode("utf-8")
+        keyed = sections and sections[0][0] is not None
+        yield b"}]" if keyed and offset < len(sections) else b"]"
+    yield b"}}"
+
+
+# -----------------------
+# Compression
+# -----------------------
+def _buffered(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BUFFER_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def encode_stream(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a byte stream incrementally with the negotiated Content-Encoding"""
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+        for chunk in _buffered(chunks):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    elif encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        for chunk in _buffered(chunks):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    else:
+        yield from _buffered(chunks)
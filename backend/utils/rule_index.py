@@ -0,0 +1,263 @@
+# utils/rule_index.py
+"""
+Full-text index over processed guidelines (SQLite FTS5).
+
+Every successful job adds the ``rules`` and ``semantics`` sections of its
+final JSON to the index, keyed by the PDF's SHA-256 so re-processing a
+document replaces its old entries. Each leaf of the JSON becomes one row:
+section (e.g. "301. Non-U.S. Citizen Eligibility"), subsection path and text.
+Searches are ranked with BM25 (section and subsection titles weigh more than
+body text) and can be filtered by lender, so questions like "which lenders
+allow non-U.S. citizen borrowers" are answered without any LLM call.
+
+The index is a local SQLite file (WAL mode, one connection per thread); with
+several nodes each node indexes the documents it processed.
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+from config import RULE_INDEX_PATH
+
+INDEXED_COMPONENTS = ("rules", "semantics")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    lender TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_lender ON documents (lender COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    component TEXT NOT NULL,
+    section TEXT NOT NULL,
+    subsection TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5 (
+    section, subsection, body,
+    content = 'entries', content_rowid = 'id',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, section, subsection, body)
+    VALUES (new.id, new.section, new.subsection, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, section, subsection, body)
+    VALUES ('delete', old.id, old.section, old.subsection, old.body);
+END;
+"""
+
+# Entry rowids are (document id << ENTRY_BITS) + n, so a match's document is
+# ``rowid >> ENTRY_BITS`` without reading the entries table: per-lender counts
+# and lender filters only touch the full-text index and the small documents table.
+ENTRY_BITS = 20
+MAX_ENTRIES_PER_DOCUMENT = 1 << ENTRY_BITS
+
+# bm25() column weights: section, subsection, body
+RANK_WEIGHTS = (4.0, 2.0, 1.0)
+
+
+def flatten_component(node, path: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], str]]:
+    """(key path, text) for every leaf of a generator's JSON; lists of scalars are joined"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from flatten_component(value, path + (str(key),))
+    elif isinstance(node, list):
+        if all(not isinstance(item, (dict, list)) for item in node):
+            if node:
+                yield path, "; ".join(str(item) for item in node)
+        else:
+            for item in node:
+                yield from flatten_component(item, path)
+    elif node is not None and str(node).strip():
+        yield path, str(node)
+
+
+def build_match_query(terms: Optional[str], phrase: Optional[str]) -> str:
+    """FTS5 MATCH expression: every term must appear, the phrase verbatim; user input is always quoted"""
+    parts = []
+    for term in (terms or "").split():
+        parts.append('"' + term.replace('"', '""') + '"')
+    if phrase and phrase.strip():
+        parts.append('"' + phrase.strip().replace('"', '""') + '"')
+    return " AND ".join(parts)
+
+
+class RuleIndex:
+    def __init__(self, path: str = RULE_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
+            self._local.conn = conn
+        return conn
+
+    # -----------------------
+    # Indexing
+    # -----------------------
+    def add_document(self, doc_key: str, lender: str, filename: str, final_json: dict) -> int:
+        """(Re)index one document's rules and semantics; returns the number of entries"""
+        rows = []
+        for component in INDEXED_COMPONENTS:
+            for path, body in flatten_component(final_json.get(component) or []):
+                section = path[0] if path else ""
+                subsection = " > ".join(path[1:])
+                rows.append((component, section, subsection, body))
+        rows = rows[:MAX_ENTRIES_PER_DOCUMENT]
+
+        conn = self._connect()
+        with self._write_lock, conn:
+            row = conn.execute("SELECT id FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+            if row is None:
+                doc_id = conn.execute(
+                    "INSERT INTO documents (doc_key, lender, filename, indexed_at) VALUES (?, ?, ?, ?)",
+                    (doc_key, lender, filename, time.time()),
+                ).lastrowid
+            else:
+                doc_id = row["id"]
+                conn.execute(
+                    "UPDATE documents SET lender = ?, filename = ?, indexed_at = ? WHERE id = ?",
+                    (lender, filename, time.time(), doc_id),
+                )
+                self._delete_entries(conn, doc_id)
+            base = doc_id << ENTRY_BITS
+            conn.executemany(
+                "INSERT INTO entries (id, component, section, subsection, body) VALUES (?, ?, ?, ?, ?)",
+                [(base + n,) + entry for n, entry in enumerate(rows)],
+            )
+        return len(rows)
+
+    def remove_document(self, doc_key: str) -> bool:
+        conn = self._connect()
+        with self._write_lock, conn:
+            row = conn.execute("SELECT id FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+            if row is None:
+                return False
+            self._delete_entries(conn, row["id"])
+            conn.execute("DELETE FROM documents WHERE id = ?", (row["id"],))
+        return True
+
+    @staticmethod
+    def _delete_entries(conn: sqlite3.Connection, doc_id: int):
+        base = doc_id << ENTRY_BITS
+        conn.execute("DELETE FROM entries WHERE id BETWEEN ? AND ?", (base, base + MAX_ENTRIES_PER_DOCUMENT - 1))
+
+    # -----------------------
+    # Search
+    # -----------------------
+    def search(
+        self,
+        terms: Optional[str] = None,
+        phrase: Optional[str] = None,
+        lenders: Optional[List[str]] = None,
+        component: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        """Ranked matches plus a per-lender hit count for the same query"""
+        match = build_match_query(terms, phrase)
+        if not match:
+            raise ValueError("Provide search terms or a phrase")
+
+        where = ["entries_fts MATCH ?"]
+        params: list = [match]
+        if lenders:
+            where.append(
+                f"entries_fts.rowid >> {ENTRY_BITS} IN "
+                f"(SELECT id FROM documents WHERE lender COLLATE NOCASE IN ({', '.join('?' * len(lenders))}))"
+            )
+            params.extend(lenders)
+        if component:
+            # Only this filter needs the entries row of every match
+            where.append("EXISTS (SELECT 1 FROM entries e WHERE e.id = entries_fts.rowid AND e.component = ?)")
+            params.append(component)
+        matches = f"FROM entries_fts WHERE {' AND '.join(where)}"
+
+        start = time.perf_counter()
+        conn = self._connect()
+        # Rank inside the full-text index, then read only the page of results
+        top = conn.execute(
+            "SELECT entries_fts.rowid AS id, "
+            "snippet(entries_fts, 2, '[', ']', '…', 16) AS snippet, "
+            f"bm25(entries_fts, {', '.join(map(str, RANK_WEIGHTS))}) AS score "
+            f"{matches} ORDER BY score LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        details = {}
+        if top:
+            details = {
+                row["id"]: dict(row) for row in conn.execute(
+                    "SELECT e.id, d.doc_key, d.lender, d.filename, e.component, e.section, e.subsection "
+                    f"FROM entries e JOIN documents d ON d.id = e.id >> {ENTRY_BITS} "
+                    f"WHERE e.id IN ({', '.join('?' * len(top))})",
+                    [row["id"] for row in top],
+                )
+            }
+        by_lender = conn.execute(
+            "SELECT d.lender, SUM(hits.n) AS hits, COUNT(*) AS documents FROM ("
+            f"    SELECT entries_fts.rowid >> {ENTRY_BITS} AS doc_id, COUNT(*) AS n {matches} GROUP BY doc_id"
+            ") AS hits "
+            "JOIN documents d ON d.id = hits.doc_id "
+            "GROUP BY d.lender ORDER BY hits DESC",
+            params,
+        ).fetchall()
+
+        return {
+            "query": match,
+            "total": sum(row["hits"] for row in by_lender),
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+            "lenders": [dict(row) for row in by_lender],
+            "results": [
+                {
+                    **{k: v for k, v in details[row["id"]].items() if k != "id"},
+                    "snippet": row["snippet"],
+                    # bm25() is lower-is-better; report higher-is-better scores
+                    "score": round(-row["score"], 4),
+                }
+                for row in top if row["id"] in details
+            ],
+        }
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        return {
+            "documents": conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            "lenders": conn.execute("SELECT COUNT(DISTINCT lender) FROM documents").fetchone()[0],
+            "entries": conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_rule_index() -> RuleIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RuleIndex()
+        return _index
+
+
+def lender_from_filename(filename: str) -> str:
+    """Default lender label: the file name without extension, separators as spaces"""
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    return re.sub(r"[_\-]+", " ", stem).strip() or "Unknown"
@@ -0,0 +1,13 @@
+# utils/throttle.py
+"""
+Process-wide budget for outbound Azure calls.
+
+Every OCR chunk and every chat completion acquires a slot here, so single
+uploads and whole batches share one quota instead of each job fanning out
+on its own and overrunning the Azure rate limits.
+"""
+import threading
+from config import OCR_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY
+
+ocr_slots = threading.BoundedSemaphore(OCR_MAX_CONCURRENCY)
+llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)